@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+from flask import jsonify
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+class AdmissionController:
+    """Caps concurrent work on the heavy endpoints.
+
+    At most `max_inflight` requests run at once, up to `max_queue` more wait
+    for a slot, and anything beyond that is turned away immediately with a
+    503 so admitted requests keep a predictable latency.
+    """
+
+    def __init__(self, max_inflight, max_queue, queue_timeout, retry_after=1):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self._cond = threading.Condition()
+        self.inflight = 0
+        self.waiting = 0
+
+        # Metrics
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.peak_waiting = 0
+        self.total_wait = 0.0
+        self.recent_waits = deque(maxlen=1000)
+
+    @classmethod
+    def from_env(cls):
+        max_inflight = _env_int('BIBLIO_MAX_INFLIGHT', os.cpu_count() or 4)
+        return cls(
+            max_inflight=max_inflight,
+            max_queue=_env_int('BIBLIO_MAX_QUEUE', max_inflight * 2),
+            queue_timeout=_env_float('BIBLIO_QUEUE_TIMEOUT', 2.0),
+            retry_after=_env_int('BIBLIO_RETRY_AFTER', 1),
+        )
+
+    def acquire(self):
+        """Returns True once a slot is held, False if the request was shed."""
+        start = time.perf_counter()
+        with self._cond:
+            if self.inflight >= self.max_inflight:
+                # Queue full -> reject without waiting at all
+                if self.waiting >= self.max_queue:
+                    self.rejected += 1
+                    return False
+
+                self.waiting += 1
+                self.peak_waiting = max(self.peak_waiting, self.waiting)
+                deadline = start + self.queue_timeout
+                try:
+                    while self.inflight >= self.max_inflight:
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            self.timed_out += 1
+                            return False
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+
+            self.inflight += 1
+            self.admitted += 1
+            waited = time.perf_counter() - start
+            self.total_wait += waited
+            self.recent_waits.append(waited)
+            return True
+
+    def release(self):
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify()
+
+    def limit(self, view):
+        """Route decorator: run `view` only once admitted, else 503."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.acquire():
+                response = jsonify({"error": "Server busy, please retry shortly"})
+                response.status_code = 503
+                response.headers['Retry-After'] = str(self.retry_after)
+                return response
+            try:
+                return view(*args, **kwargs)
+            finally:
+                self.release()
+        return wrapper
+
+    def snapshot(self):
+        with self._cond:
+            waits = sorted(self.recent_waits)
+            return {
+                "max_inflight": self.max_inflight,
+                "max_queue": self.max_queue,
+                "inflight": self.inflight,
+                "queue_depth": self.waiting,
+                "peak_queue_depth": self.peak_waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "wait_ms": {
+                    "mean": 1000 * self.total_wait / self.admitted if self.admitted else 0.0,
+                    "p50": 1000 * waits[len(waits) // 2] if waits else 0.0,
+                    "p95": 1000 * waits[int(len(waits) * 0.95)] if waits else 0.0,
+                    "max": 1000 * waits[-1] if waits else 0.0,
+                },
+            }
@@ -1,108 +1,851 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+import base64
+import hashlib
+import os
 import pickle
+import re
+import threading
+import uuid
+from functools import wraps
 import numpy as np
+import pandas as pd
 from thefuzz import process
+from admission import AdmissionController
+from als import fold_in, recommend as als_recommend
+from artifacts import read_version
+from authors import AuthorIndex
+from diversity import mmr, pairwise_cosines, table_similarities
+from fragments import FragmentStore, catalog_fragments, dumps, json_array, json_object
+from goodreads import CatalogMatcher, read_export
+from matching import MIN_SCORE
+from profiles import ProfileCache, TasteProfile
+from reader_sets import METRICS, ReaderSets
+from shelves import ShelfStore
 
 app = Flask(__name__)
 CORS(app)
 
+# Bounded in-flight work + wait queue for the recommendation handlers
+admission = AdmissionController.from_env()
+
+# Recommendations per book, same as the old kneighbors(n_neighbors=6) minus the book itself
+N_RECOMMENDATIONS = 5
+
+# Results for multi-book profiles (taste test, user history)
+N_PROFILE_RECOMMENDATIONS = 10
+
+# Largest ?limit= for paged lists (a request with limit or cursor gets a "next_cursor")
+MAX_PAGE_SIZE = int(os.environ.get('BIBLIO_MAX_PAGE_SIZE', 50))
+
+# 'cosine' and 'content' read precomputed neighbor tables, 'hybrid' blends the two;
+# the reader-set metrics are computed per request, 'als' folds the input books into a profile
+ENGINES = ('cosine', 'content', 'hybrid', 'als') + METRICS
+
+# What each engine's results are based on, returned as "source"
+ENGINE_SOURCES = {'cosine': 'collaborative', 'content': 'content', 'hybrid': 'hybrid', 'als': 'collaborative',
+                  **{metric: 'collaborative' for metric in METRICS}}
+
+# Share of the content similarity in a 'hybrid' score (the rest is collaborative)
+CONTENT_WEIGHT = float(os.environ.get('BIBLIO_CONTENT_WEIGHT', 0.3))
+
+# Bump whenever a response's format or ranking changes for the same artifacts: it is
+# part of every ETag, so clients and proxies stop revalidating old bodies after a deploy
+API_VERSION = 1
+
+# GET responses are a pure function of (API version, config, artifact version, query)
+# -> let proxies keep them
+CACHE_CONTROL = f"public, max-age={int(os.environ.get('BIBLIO_CACHE_MAX_AGE', 3600))}"
+
+# Server-side bookshelves, and how many shelves keep a live taste profile in memory
+shelf_store = ShelfStore(os.environ.get('BIBLIO_SHELF_DB', 'shelves.sqlite3'))
+shelf_profiles = ProfileCache(int(os.environ.get('BIBLIO_SHELF_CACHE', 1024)))
+SHELF_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# ?diversity= re-ranks this many of the best candidates with MMR (0 = off, 1 = most diverse)
+MMR_CANDIDATES = int(os.environ.get('BIBLIO_MMR_CANDIDATES', 50))
+
+# Authors returned by /api/authors/<name>/similar
+N_SIMILAR_AUTHORS = 10
+
+# Settings that change response bodies for the same artifacts, hashed into every ETag
+RESPONSE_CONFIG = f"{MAX_PAGE_SIZE}|{CONTENT_WEIGHT}|{MMR_CANDIDATES}"
+
+# Full ranked lists per (book, engine), so every page after the first is a slice
+ranked_lists = ProfileCache(int(os.environ.get('BIBLIO_RANKED_CACHE', 4096)))
+
+# In-memory taste-test sessions: at most this many, each expiring after this long unused.
+# The cache lock only covers lookup and expiry; each session's profile has its own lock.
+taste_sessions = ProfileCache(int(os.environ.get('BIBLIO_MAX_SESSIONS', 1000)),
+                              ttl=float(os.environ.get('BIBLIO_SESSION_TTL', 1800)))
+
 print("Loading optimized artifacts...")
 try:
-    model = pickle.load(open('model.pkl', 'rb'))
     book_sparse = pickle.load(open('book_sparse.pkl', 'rb'))
     book_names = pickle.load(open('book_names.pkl', 'rb'))
     books_metadata = pickle.load(open('books_metadata.pkl', 'rb'))
-    print("Model loaded (Fast Mode)!")
+    neighbor_ids = np.load('book_neighbors.npy')
+    neighbor_sims = np.load('book_neighbor_sims.npy')
+    book_norms = np.load('book_norms.npy')
+    # Column -> user_id, the columns in user_id order (update_model.py appends new users
+    # at the end), and the matrix by user for history lookups
+    user_ids = np.load('user_ids.npy')
+    user_columns = np.argsort(user_ids, kind='stable')
+    sorted_user_ids = user_ids[user_columns]
+    user_ratings = book_sparse.T.tocsr()
+    user_ratings.sort_indices()
+    try:
+        # Optional implicit-feedback engine (setup_model.py --reader-sets)
+        book_readers = ReaderSets(np.load('book_readers_indptr.npy'), np.load('book_readers.npy'), len(user_ids))
+    except FileNotFoundError:
+        book_readers = None
+    try:
+        # Optional content engine (setup_model.py --content), indexed by catalog id
+        content_ids = np.load('content_neighbors.npy')
+        content_sims = np.load('content_neighbor_sims.npy')
+    except FileNotFoundError:
+        content_ids = content_sims = None
+    try:
+        # Optional matrix factorization engine (setup_model.py --als)
+        als_item_factors = np.load('als_item_factors.npy')
+        als_reg, als_alpha, als_implicit = np.load('als_params.npy').tolist()
+        als_gram = als_item_factors.T @ als_item_factors
+    except FileNotFoundError:
+        als_item_factors = None
+    try:
+        # Optional series/edition clusters (setup_model.py --clusters), indexed by catalog id
+        book_clusters = np.load('book_clusters.npy')
+    except FileNotFoundError:
+        book_clusters = None
+    try:
+        # Optional similar-authors index (setup_model.py --authors)
+        author_index = AuthorIndex(np.load('author_names.npy').tolist(), np.load('author_neighbors.npy'),
+                                   np.load('author_neighbor_sims.npy'))
+    except FileNotFoundError:
+        author_index = None
+
+    # Metadata is prepared once here as plain Python values: first row per
+    # title (what `.head(1)` used to pick per request) and its JSON bytes.
+    catalog = books_metadata.drop_duplicates('title')
+    catalog_titles = catalog['title'].tolist()
+    catalog_index = {title: i for i, title in enumerate(catalog_titles)}
+    catalog_book_ids = {book_id: i for i, book_id in enumerate(catalog['book_id'].tolist())}
+    try:
+        book_fragments = FragmentStore('book_fragments.bin')
+        cf_catalog_ids = np.load('cf_catalog_ids.npy')
+    except FileNotFoundError:
+        print("No fragment blob found, encoding metadata in memory (re-run setup_model.py)")
+        book_fragments = catalog_fragments(catalog)
+        cf_catalog_ids = np.array([catalog_index.get(title, -1) for title in book_names], dtype=np.int32)
+
+    # Catalog id -> matrix row (-1: filtered out of the matrix, served cold-start)
+    catalog_cf_rows = np.full(len(catalog_titles), -1, dtype=np.int64)
+    has_metadata = cf_catalog_ids >= 0
+    catalog_cf_rows[cf_catalog_ids[has_metadata]] = np.flatnonzero(has_metadata)
+
+    # Cold-start fallback without the content engine: other books by the same
+    # (first-listed) author, best rated first
+    first_authors = catalog['authors'].fillna('').astype(str).str.split(',').str[0].str.strip().tolist()
+    by_rating = np.argsort(-catalog['average_rating'].fillna(0).to_numpy(), kind='stable')
+    author_books = {}
+    for catalog_id in by_rating.tolist():
+        author_books.setdefault(first_authors[catalog_id], []).append(catalog_id)
+    # ISBN and normalized-title lookups for bulk imports
+    catalog_matcher = CatalogMatcher(catalog_titles, catalog['isbn'].tolist())
+    artifact_version = read_version()
+    print(f"Model loaded (Fast Mode)! Artifact version {artifact_version}")
 except FileNotFoundError:
     print("CRITICAL ERROR: Run 'python setup_model.py' first!")
 
-def get_recommendations(user_input):
-    # 1. FUZZY MATCHING (Using the simple list of names)
-    match = process.extractOne(user_input, book_names)
+def book_json(catalog_id):
+    """JSON bytes for a catalog entry, or None for -1 (no metadata)."""
+    return book_fragments[catalog_id] if catalog_id >= 0 else None
+
+def listed_book_json(catalog_id):
+    """book_json with the dataset book_id the DELETE routes take, for listings of a user's books."""
+    return b'{"book_id":' + dumps(int(catalog['book_id'].iat[catalog_id])) + b',' + book_json(catalog_id)[1:]
+
+def catalog_ids_of(rows):
+    """Catalog ids of `book_sparse` rows; -1 for rows without metadata and for -1 padding."""
+    rows = np.asarray(rows)
+    return np.where(rows >= 0, cf_catalog_ids[rows], -1)
+
+def find_book(user_input):
+    """Fuzzy-match a user's title to a catalog id (None if no match).
+
+    Searches the whole catalog, not just the books that made it into the
+    matrix, so long-tail titles resolve too.
+    """
+    match = process.extractOne(user_input, catalog_titles)
     
-    if not match or match[1] < 60: # Lowered slightly for better UX
+    if not match or match[1] < MIN_SCORE:
+        return None
+    return catalog_index[match[0]]
+
+def find_book_by_id(goodbooks_id):
+    """Exact lookup by the dataset's `book_id` (None if unknown)."""
+    return catalog_book_ids.get(goodbooks_id)
+
+def engine_error(engine):
+    """Error response if `engine` can't be served, else None."""
+    if engine not in ENGINES:
+        return jsonify({"error": f"Unknown engine '{engine}', expected one of {', '.join(ENGINES)}"}), 400
+    if engine in METRICS and book_readers is None:
+        return jsonify({"error": f"Engine '{engine}' not built (run setup_model.py --reader-sets)"}), 400
+    if engine in ('content', 'hybrid') and content_ids is None:
+        return jsonify({"error": f"Engine '{engine}' not built (run setup_model.py --content)"}), 400
+    if engine == 'als' and als_item_factors is None:
+        return jsonify({"error": "Engine 'als' not built (run setup_model.py --als)"}), 400
+    return None
+
+def encode_cursor(offset):
+    """Opaque cursor for the page starting at `offset`, tied to the loaded artifacts."""
+    return base64.urlsafe_b64encode(f"{artifact_version}:{offset}".encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Offset a cursor points at, or None if it is malformed or from other artifacts."""
+    try:
+        text = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        version, offset = text.rsplit(':', 1)
+        offset = int(offset)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return offset if version == str(artifact_version) and offset >= 0 else None
+
+def page_request(params, default_limit=N_RECOMMENDATIONS):
+    """(offset, limit, paged) from the `limit` / `cursor` parameters; ValueError if invalid."""
+    limit, cursor = params.get('limit'), params.get('cursor')
+    if limit is None and cursor is None:
+        return 0, default_limit, False
+    try:
+        limit = default_limit if limit is None else int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    offset = 0 if cursor is None else decode_cursor(str(cursor))
+    if offset is None:
+        raise ValueError("Invalid or expired cursor")
+    return offset, limit, True
+
+def page_of(ranked, page):
+    """The requested slice of a ranked list, and the cursor after it (None at the end)."""
+    offset, limit, _ = page
+    return ranked[offset:offset + limit], encode_cursor(offset + limit) if offset + limit < len(ranked) else None
+
+def diversity_request(params):
+    """The `diversity` parameter as a float in [0, 1] (0 if absent); ValueError if invalid."""
+    try:
+        diversity = float(params.get('diversity', 0) or 0)
+    except (TypeError, ValueError):
+        raise ValueError("diversity must be a number")
+    if not 0 <= diversity <= 1:
+        raise ValueError("diversity must be between 0 and 1")
+    return diversity
+
+def cluster_mask(catalog_ids, exclude=()):
+    """Mask keeping the first book (best first) of each series/edition cluster,
+    minus the clusters of `exclude` (the input books). Without clusters built,
+    every book is its own cluster."""
+    catalog_ids = np.asarray(catalog_ids, dtype=np.int64)
+    exclude = np.asarray(list(exclude), dtype=np.int64)
+    exclude = exclude[exclude >= 0]
+    if book_clusters is None:
+        return ~np.isin(catalog_ids, exclude)
+    clusters = book_clusters[catalog_ids]
+    keep = np.zeros(len(catalog_ids), dtype=bool)
+    keep[np.unique(clusters, return_index=True)[1]] = True
+    return keep & ~np.isin(clusters, book_clusters[exclude])
+
+def deduplicated(catalog_ids, exclude=()):
+    """The catalog ids `cluster_mask` keeps, as a list."""
+    return np.asarray(catalog_ids, dtype=np.int64)[cluster_mask(catalog_ids, exclude)].tolist()
+
+def candidate_depth(n):
+    """Ranked candidates to fetch for n results (cluster dedupe may drop some)."""
+    return 2 * n if book_clusters is None else 5 * n
+
+def get_recommendations(user_input, engine='cosine', page=(0, N_RECOMMENDATIONS, False), diversity=0.0):
+    # 1. FUZZY MATCHING (over the whole catalog)
+    catalog_id = find_book(user_input)
+    if catalog_id is None:
         return {"error": "Book not found"}
+    return recommendations_for(catalog_id, engine, page, diversity)
 
-    actual_title = match[0]
-    
-    # 2. GET METADATA
-    found_book_meta = books_metadata[books_metadata['title'] == actual_title].head(1)
-    found_book_data = {}
-    
-    if not found_book_meta.empty:
-        found_book_data = {
-            "title": actual_title,
-            "isbn": found_book_meta['isbn'].values[0],
-            "author": found_book_meta['authors'].values[0],
-            "original_img": found_book_meta['img_url'].values[0],
-            "rating": found_book_meta['average_rating'].values[0]
-        }
+def content_neighbors(catalog_id):
+    """Precomputed content neighbors of a catalog entry (empty if it has none)."""
+    if content_ids is None or not 0 <= catalog_id < len(content_ids):
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    return content_ids[catalog_id], content_sims[catalog_id]
+
+def blended_neighbors(book_id, catalog_id, content_weight):
+    """Catalog ids and scores ranked by (1 - w) * collaborative + w * content similarity.
+
+    Both lists are short precomputed rows, so this costs O(k) whatever the
+    catalog size; a book in only one list just gets that list's share.
+    """
+    ids, sims = content_neighbors(catalog_id)
+    ids = np.concatenate([catalog_ids_of(neighbor_ids[book_id]), ids])
+    scores = np.concatenate([(1 - content_weight) * neighbor_sims[book_id], content_weight * sims])
+    keep = (ids >= 0) & np.isfinite(scores) & (ids != catalog_id)
+    unique, inverse = np.unique(ids[keep], return_inverse=True)
+    totals = np.bincount(inverse, weights=scores[keep])
+    order = np.argsort(-totals, kind='stable')
+    return unique[order], totals[order]
+
+def author_neighbors(catalog_id):
+    """Other books by the same first-listed author, best rated first."""
+    return [other for other in author_books.get(first_authors[catalog_id], []) if other != catalog_id]
+
+def cold_start_neighbors(catalog_id):
+    """Neighbors for a book without a matrix row: content if built, else same author."""
+    ids, sims = content_neighbors(catalog_id)
+    if len(ids):
+        return ids, sims, 'content'
+    ids = np.array(author_neighbors(catalog_id), dtype=np.int64)
+    return ids, 1.0 / (1.0 + np.arange(len(ids))), 'author'  # no similarity: rank-based
+
+def profile_recommendations(rows, n, ratings=None, disliked=(), disliked_ratings=None):
+    """Catalog ids and scores for a reader who liked matrix rows `rows` (ALS fold-in),
+    steered away from `disliked` rows."""
+    user_vector = fold_in(als_item_factors, rows, ratings, als_reg, als_alpha, bool(als_implicit), als_gram,
+                          disliked, disliked_ratings)
+    best, scores = als_recommend(als_item_factors, user_vector, n, exclude=list(rows) + list(disliked))
+    return catalog_ids_of(best), scores
+
+def scored_neighbors(catalog_id, engine='cosine', n=2 * N_RECOMMENDATIONS):
+    """(catalog ids, similarities, source) of a book's neighbors, best first.
+
+    Ids may contain -1 (no metadata, or padding in lists the LSH build could
+    not fill). Precomputed tables return their full depth; `n` bounds the
+    engines computed per request.
+    """
+    book_id = int(catalog_cf_rows[catalog_id])
+    if book_id < 0:
+        return cold_start_neighbors(catalog_id)
+    if engine == 'cosine':
+        ids, sims = catalog_ids_of(neighbor_ids[book_id]), neighbor_sims[book_id]
+    elif engine == 'content':
+        ids, sims = content_neighbors(catalog_id)
+    elif engine == 'hybrid':
+        ids, sims = blended_neighbors(book_id, catalog_id, CONTENT_WEIGHT)
+    elif engine == 'als':
+        ids, sims = profile_recommendations([book_id], n)
+    else:
+        rows, sims = book_readers.top_neighbors(book_id, n, engine)
+        ids = catalog_ids_of(rows)
+    return ids, sims, ENGINE_SOURCES[engine]
+
+def candidate_similarities(catalog_ids):
+    """Pairwise similarity for MMR: cosine of ALS factors if built, else the
+    collaborative neighbor table (0 for cold books either way)."""
+    rows = catalog_cf_rows[np.asarray(catalog_ids, dtype=np.int64)]
+    if als_item_factors is not None:
+        return pairwise_cosines(als_item_factors[rows.clip(0)] * (rows >= 0)[:, None])
+    return table_similarities(rows, neighbor_ids, neighbor_sims)
+
+def diversified(ids, scores, diversity, n=MMR_CANDIDATES):
+    """The first n of the top MMR_CANDIDATES catalog ids in MMR order."""
+    pool = list(ids[:MMR_CANDIDATES])
+    if not pool:
+        return []
+    order = mmr(scores[:len(pool)], candidate_similarities(pool), n, diversity)
+    return [pool[i] for i in order]
+
+def ranked_list(catalog_id, engine, diversity=0.0):
+    """(catalog ids, scores, source) of a book's neighbors to the depth of the
+    precomputed tables, best first. Built once per (book, engine, diversity) and
+    cached; with diversity the head of the list is MMR-ordered (and has no scores)."""
+    def build():
+        if diversity:
+            ids, scores, source = ranked_list(catalog_id, engine)
+            head = diversified(ids, scores, diversity)
+            return head + ids[len(head):], None, source
+        ids, sims, source = scored_neighbors(catalog_id, engine, n=neighbor_ids.shape[1])
+        ids, sims = np.asarray(ids), np.asarray(sims)
+        keep = ids >= 0
+        keep[keep] = cluster_mask(ids[keep], [catalog_id])
+        return ids[keep].tolist(), sims[keep], source
+    return ranked_lists.get((catalog_id, engine, diversity), build)
 
-    # 3. FIND NEIGHBORS (Using Sparse Logic)
-    try:
-        # Find the index in the list
-        book_id = book_names.index(actual_title)
-        
-        # Pass the SPARSE row to the model
-        distance, suggestion = model.kneighbors(book_sparse[book_id], n_neighbors=6)
-        
-        recommended_books = []
-        for i in range(len(suggestion[0])): # Notice suggestion[0]
-            idx = suggestion[0][i]
-            recommended_title = book_names[idx]
-            
-            if recommended_title == actual_title: continue 
-            
-            meta = books_metadata[books_metadata['title'] == recommended_title].head(1)
-            
-            if not meta.empty:
-                recommended_books.append({
-                    "title": recommended_title,
-                    "isbn": meta['isbn'].values[0],
-                    "author": meta['authors'].values[0],
-                    "original_img": meta['img_url'].values[0],
-                    "rating": meta['average_rating'].values[0]
-                })
-        
-        return {
-            "found_book": found_book_data, 
-            "recommendations": recommended_books
+def recommendations_for(catalog_id, engine='cosine', page=(0, N_RECOMMENDATIONS, False), diversity=0.0):
+    # 2. FIND NEIGHBORS (Precomputed by setup_model.py, or AND + popcount over reader sets)
+    try:
+        ranked, _, source = ranked_list(catalog_id, engine, diversity)
+        recommended_ids, next_cursor = page_of(ranked, page)
+
+        results = {
+            "found_book": catalog_id,
+            "recommendations": recommended_ids,
+            "source": source,
         }
+        if page[2]:
+            results["next_cursor"] = next_cursor
+        return results
 
     except IndexError:
         return {"error": "Error processing book data"}
 
+def recommend_response(results):
+    if "error" in results: return jsonify(results)
+
+    # 3. ASSEMBLE RESPONSE from pre-serialized book fragments
+    body = json_object([
+        ("found_book", book_json(results['found_book']) or b'{}'),
+        ("recommendations", json_array([book_json(i) for i in results['recommendations']])),
+        ("source", dumps(results['source'])),
+    ] + ([("next_cursor", dumps(results['next_cursor']))] if "next_cursor" in results else []))
+    return Response(body, mimetype='application/json')
+
+def conditional_get(view):
+    """Strong ETag + Cache-Control for GET views; a matching If-None-Match
+    is answered with 304 before the request even reaches admission control."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        query = [(key, request.args.getlist(key)) for key in sorted(request.args)]
+        key = f"{API_VERSION}|{RESPONSE_CONFIG}|{artifact_version}|{request.path}|{query}"
+        etag = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200: return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        return response
+    return wrapper
+
 @app.route('/api/recommend', methods=['POST'])
+@admission.limit
 def recommend():
     data = request.json
     user_input = data.get('book_name')
+    engine = data.get('engine', 'cosine')
     if not user_input: return jsonify({"error": "No book name provided"}), 400
-    results = get_recommendations(user_input)
-    if "error" in results: return jsonify(results) 
-    return jsonify(results)
+    if engine_error(engine): return engine_error(engine)
+    try:
+        page, diversity = page_request(data), diversity_request(data)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    return recommend_response(get_recommendations(user_input, engine, page, diversity))
+
+@app.route('/api/recommend', methods=['GET'])
+@conditional_get
+@admission.limit
+def recommend_get():
+    # ?id= is the dataset's book_id (exact), ?title= goes through fuzzy matching
+    goodbooks_id = request.args.get('id', type=int)
+    engine = request.args.get('engine', 'cosine')
+    if engine_error(engine): return engine_error(engine)
+    try:
+        page, diversity = page_request(request.args), diversity_request(request.args)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    if goodbooks_id is not None:
+        catalog_id = find_book_by_id(goodbooks_id)
+        if catalog_id is None: return jsonify({"error": "Book not found"})
+        return recommend_response(recommendations_for(catalog_id, engine, page, diversity))
+    user_input = request.args.get('title')
+    if not user_input: return jsonify({"error": "No book title or id provided"}), 400
+    return recommend_response(get_recommendations(user_input, engine, page, diversity))
 
 @app.route('/api/taste_test', methods=['POST'])
+@admission.limit
 def taste_test():
+    # "books": titles, or {"title": ..., "weight": ...}; "dislikes": titles to steer away from
     data = request.json
+    if not isinstance(data, dict): return jsonify({"error": "Expected a JSON object"}), 400
     book_list = data.get('books', [])
+    engine = data.get('engine', 'cosine')
     if not book_list: return jsonify({"error": "No books provided"}), 400
-    
-    aggregated_recommendations = {} 
-    
-    for book_name in book_list:
-        result = get_recommendations(book_name)
-        if "error" in result: continue
-        for rec in result['recommendations']:
-            title = rec['title']
-            if title in aggregated_recommendations:
-                aggregated_recommendations[title]['score'] += 1
-            else:
-                aggregated_recommendations[title] = {"data": rec, "score": 1}
-
-    final_list = sorted(aggregated_recommendations.values(), key=lambda x: x['score'], reverse=True)
-    clean_list = [item['data'] for item in final_list]
-    return jsonify(clean_list[:10])
+    if engine_error(engine): return engine_error(engine)
+    try:
+        inputs = taste_inputs(book_list, data.get('dislikes', []))
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    try:
+        diversity = diversity_request(data)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    return taste_test_response(inputs, engine, diversity)
+
+@app.route('/api/taste_test', methods=['GET'])
+@conditional_get
+@admission.limit
+def taste_test_get():
+    # ?books=...&books=... with optional &weights=... (one per book), &dislikes=... and &diversity=
+    book_list = request.args.getlist('books')
+    weights = request.args.getlist('weights', type=float)
+    engine = request.args.get('engine', 'cosine')
+    if not book_list: return jsonify({"error": "No books provided"}), 400
+    if engine_error(engine): return engine_error(engine)
+    if weights:
+        if len(weights) != len(book_list): return jsonify({"error": "Need one weight per book"}), 400
+        book_list = [{"title": title, "weight": weight} for title, weight in zip(book_list, weights)]
+    try:
+        inputs = taste_inputs(book_list, request.args.getlist('dislikes'))
+        diversity = diversity_request(request.args)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    return taste_test_response(inputs, engine, diversity)
+
+def taste_inputs(book_list, dislikes=()):
+    """[(title, weight)]: liked books at their weight (default 1), dislikes at minus theirs.
+
+    Raises ValueError unless both are lists of titles or of {"title", "weight"} objects.
+    """
+    return weighted_titles(book_list, 'books', 1.0) + weighted_titles(dislikes, 'dislikes', -1.0)
+
+def weighted_titles(items, field, sign):
+    """[(title, sign x weight)] from a request's list of titles or {"title", "weight"} objects."""
+    error = f'"{field}" must be a list of titles or of objects with a title (and optional numeric weight)'
+    if not isinstance(items, list): raise ValueError(error)
+    inputs = []
+    for item in items:
+        title, weight = (item.get('title'), item.get('weight', 1.0)) if isinstance(item, dict) else (item, 1.0)
+        if (not isinstance(title, str) or isinstance(weight, bool) or not isinstance(weight, (int, float))
+                or not np.isfinite(weight)):
+            raise ValueError(error)
+        inputs.append((title, sign * float(weight)))
+    return inputs
+
+def taste_scores(inputs, engine='cosine'):
+    """Similarity-weighted votes over the whole catalog from [(catalog_id, weight)].
+
+    Each input adds weight x similarity to every neighbor it has, into one
+    array indexed by catalog id, so a book close to several inputs beats one
+    that barely appears in a single list, and dislikes subtract.
+    """
+    totals = np.zeros(len(catalog_titles), dtype=np.float64)
+    for catalog_id, weight in inputs:
+        ids, sims, _ = scored_neighbors(catalog_id, engine, n=neighbor_ids.shape[1])
+        keep = (ids >= 0) & np.isfinite(sims)
+        totals[ids[keep]] += weight * sims[keep]   # ids are unique within one list
+    totals[[catalog_id for catalog_id, _ in inputs]] = -np.inf
+    return totals
+
+def top_scored(totals, n):
+    """Catalog ids of the n highest positive totals, best first."""
+    candidates = np.flatnonzero(totals > 0)
+    n = min(n, len(candidates))
+    if n == 0:
+        return []
+    best = candidates[np.argpartition(-totals[candidates], n - 1)[:n]]
+    return best[np.argsort(-totals[best], kind='stable')].tolist()
+
+def taste_test_response(inputs, engine='cosine', diversity=0.0):
+    resolved = [(catalog_id, weight) for catalog_id, weight in
+                ((find_book(title), weight) for title, weight in inputs) if catalog_id is not None]
+
+    depth = MMR_CANDIDATES if diversity else candidate_depth(N_PROFILE_RECOMMENDATIONS)
+    if engine == 'als':
+        # One profile from every title instead of a vote over per-title lists; dislikes go in
+        # as strongly observed non-preferences
+        weights = {int(catalog_cf_rows[catalog_id]): weight for catalog_id, weight in resolved
+                   if catalog_cf_rows[catalog_id] >= 0}
+        rows = sorted(row for row, weight in weights.items() if weight > 0)
+        disliked = sorted(row for row, weight in weights.items() if weight < 0)
+        if not rows: return Response(json_array([]), mimetype='application/json')
+        ids, scores = profile_recommendations(rows, depth + len(resolved), [5.0 * weights[row] for row in rows],
+                                              disliked, [-5.0 * weights[row] for row in disliked])
+        keep = ids >= 0
+        final_list, scores = ids[keep], scores[keep]
+    else:
+        totals = taste_scores(resolved, engine)
+        final_list = np.array(top_scored(totals, depth), dtype=np.int64)
+        scores = totals[final_list]
+    # One book per series/edition, none from the inputs' own
+    keep = cluster_mask(final_list, [catalog_id for catalog_id, _ in resolved])
+    final_list, scores = final_list[keep].tolist(), scores[keep]
+    if diversity:
+        final_list = diversified(final_list, scores, diversity, N_PROFILE_RECOMMENDATIONS)
+    return Response(json_array([book_json(i) for i in final_list[:N_PROFILE_RECOMMENDATIONS]]), mimetype='application/json')
+
+def user_recommendations(user_id, n):
+    """Catalog ids for a known reader from their rating history, or None if unknown."""
+    position = np.searchsorted(sorted_user_ids, user_id)
+    if position >= len(sorted_user_ids) or sorted_user_ids[position] != user_id:
+        return None
+    col = user_columns[position]
+    start, stop = user_ratings.indptr[col], user_ratings.indptr[col + 1]
+    return history_recommendations(user_ratings.indices[start:stop], user_ratings.data[start:stop], n)
+
+def history_recommendations(rated, ratings, n):
+    """Catalog ids for a reader who rated matrix rows `rated` (sorted, unique).
+
+    Each rated book votes for its precomputed neighbors with similarity x
+    (rating - the reader's mean rating), so disliked books push their
+    neighbors down. Cost is O(ratings x k), independent of the catalog size.
+    """
+    ratings = np.asarray(ratings, dtype=np.float32)
+    weights = ratings - ratings.mean() if len(ratings) else ratings
+    if not weights.any():
+        weights = np.ones_like(ratings)
+
+    ids = neighbor_ids[rated].ravel()
+    scores = (neighbor_sims[rated] * weights[:, None]).ravel()
+    keep = (ids >= 0) & np.isfinite(scores)
+    candidates, inverse = np.unique(ids[keep], return_inverse=True)
+    totals = np.bincount(inverse, weights=scores[keep])
+
+    # Already-read books out: set difference of two sorted index arrays
+    position = np.minimum(np.searchsorted(rated, candidates), max(len(rated) - 1, 0))
+    unseen = rated[position] != candidates if len(rated) else np.ones(len(candidates), dtype=bool)
+    candidates, totals = candidates[unseen], totals[unseen]
+
+    n = min(candidate_depth(n), len(candidates))
+    if n == 0:
+        return []
+    best = np.argpartition(-totals, n - 1)[:n]
+    best = best[np.argsort(-totals[best], kind='stable')]
+    ids = catalog_ids_of(candidates[best])
+    return deduplicated(ids[ids >= 0], catalog_ids_of(rated))
+
+@app.route('/api/users/<int:user_id>/recommendations', methods=['GET'])
+@conditional_get
+@admission.limit
+def recommend_for_user(user_id):
+    recommended = user_recommendations(user_id, N_PROFILE_RECOMMENDATIONS)
+    if recommended is None: return jsonify({"error": "User not found"})
+    body = json_object([
+        ("user_id", dumps(user_id)),
+        ("recommendations", json_array([book_json(i) for i in recommended[:N_PROFILE_RECOMMENDATIONS]])),
+        ("source", dumps('collaborative')),
+    ])
+    return Response(body, mimetype='application/json')
+
+@app.route('/api/authors/<name>/similar', methods=['GET'])
+@conditional_get
+@admission.limit
+def similar_authors(name):
+    # Each similar author comes with their best-rated book
+    if author_index is None: return jsonify({"error": "Author index not built (run setup_model.py --authors)"}), 400
+    author = author_index.find(name)
+    if author is None: return jsonify({"error": "Author not found"})
+    similar = []
+    for other, similarity in author_index.similar(author, N_SIMILAR_AUTHORS):
+        other_name = author_index.names[other]
+        books = author_books.get(other_name, [])
+        similar.append(json_object([
+            ("name", dumps(other_name)),
+            ("similarity", dumps(round(similarity, 4))),
+            ("top_book", book_json(books[0]) if books else b'null'),
+        ]))
+    body = json_object([("author", dumps(author_index.names[author])), ("similar", json_array(similar))])
+    return Response(body, mimetype='application/json')
+
+@app.route('/api/import/goodreads', methods=['POST'])
+@admission.limit
+def import_goodreads():
+    # The CSV as a multipart upload ('file') or as the raw request body
+    upload = request.files.get('file')
+    data = upload.read() if upload else request.get_data()
+    if not data: return jsonify({"error": "No CSV provided"}), 400
+    try:
+        library = read_export(data)
+    except (ValueError, pd.errors.ParserError) as error:
+        return jsonify({"error": f"Could not read CSV: {error}"}), 400
+
+    catalog_ids, methods = catalog_matcher.resolve(library['title'], library['isbn'], library['isbn13'])
+    resolved = catalog_ids >= 0
+
+    # Profile from the matched books that have a matrix row; unrated shelf entries count as a 4
+    ratings = np.where(library['rating'].to_numpy() > 0, library['rating'].to_numpy(), 4)[resolved]
+    rows = catalog_cf_rows[catalog_ids[resolved]]
+    rated, first = np.unique(rows, return_index=True)  # one rating per book, the export's first row wins
+    ratings = ratings[first][rated >= 0]
+    rated = rated[rated >= 0]
+
+    recommended, source = [], 'collaborative'
+    if len(rated) and als_item_factors is not None:
+        recommended, _ = profile_recommendations(rated, candidate_depth(N_PROFILE_RECOMMENDATIONS), ratings)
+    elif len(rated):
+        recommended = history_recommendations(rated, ratings, N_PROFILE_RECOMMENDATIONS)
+    # One book per series/edition, none from the library's own (matrix row or not)
+    recommended = np.asarray(recommended, dtype=np.int64)
+    recommended = deduplicated(recommended[recommended >= 0], catalog_ids[resolved])
+
+    unresolved = [{"row": i + 1, "title": title} for i, title in enumerate(library['title']) if not resolved[i]]
+    matched_by = {method: methods.count(method) for method in ('isbn', 'title', 'fuzzy')}
+    body = json_object([
+        ("matched", dumps(int(resolved.sum()))),
+        ("matched_by", dumps(matched_by)),
+        ("unresolved", dumps(unresolved)),
+        ("recommendations", json_array([book_json(i) for i in recommended[:N_PROFILE_RECOMMENDATIONS]])),
+        ("source", dumps(source)),
+    ])
+    return Response(body, mimetype='application/json')
+
+def shelf_entry(shelf_id):
+    """Live taste profile of a shelf, rebuilt from the store if it was evicted."""
+    def build():
+        profile = TasteProfile(book_sparse, book_norms)
+        for book_id in shelf_store.books(shelf_id):
+            row = shelf_row(book_id)
+            if row >= 0: profile.add(row)
+        return {"profile": profile, "feed": None, "feed_version": -1}
+    return shelf_profiles.get(shelf_id, build)
+
+def shelf_row(book_id):
+    """Matrix row of a dataset book_id, or -1 (unknown, or not in the matrix)."""
+    catalog_id = catalog_book_ids.get(book_id)
+    return -1 if catalog_id is None else int(catalog_cf_rows[catalog_id])
+
+@app.route('/api/shelves/<shelf_id>', methods=['GET'])
+def get_shelf(shelf_id):
+    if not SHELF_ID.match(shelf_id): return jsonify({"error": "Invalid shelf id"}), 400
+    catalog_ids = [catalog_book_ids[book_id] for book_id in shelf_store.books(shelf_id) if book_id in catalog_book_ids]
+    return Response(json_object([("books", json_array([listed_book_json(i) for i in catalog_ids]))]),
+                    mimetype='application/json')
+
+@app.route('/api/shelves/<shelf_id>/books', methods=['POST'])
+def add_to_shelf(shelf_id):
+    # {"book_id": <dataset book_id>} or {"title": "..."} (fuzzy matched)
+    if not SHELF_ID.match(shelf_id): return jsonify({"error": "Invalid shelf id"}), 400
+    data = request.json or {}
+    if not isinstance(data, dict): return jsonify({"error": "Expected a JSON object"}), 400
+    if data.get('book_id') is not None:
+        catalog_id = find_book_by_id(data['book_id'])
+    elif data.get('title'):
+        catalog_id = find_book(data['title'])
+    else:
+        return jsonify({"error": "No book_id or title provided"}), 400
+    if catalog_id is None: return jsonify({"error": "Book not found"})
+
+    book_id = int(catalog['book_id'].iat[catalog_id])
+    with shelf_profiles.lock:
+        added = shelf_store.add(shelf_id, book_id)
+        row = int(catalog_cf_rows[catalog_id])
+        if added and row >= 0:
+            shelf_entry(shelf_id)['profile'].add(row)
+    return Response(json_object([("added", dumps(added)), ("book_id", dumps(book_id)),
+                                 ("book", book_json(catalog_id))]), mimetype='application/json')
+
+@app.route('/api/shelves/<shelf_id>/books/<int:book_id>', methods=['DELETE'])
+def remove_from_shelf(shelf_id, book_id):
+    if not SHELF_ID.match(shelf_id): return jsonify({"error": "Invalid shelf id"}), 400
+    with shelf_profiles.lock:
+        removed = shelf_store.remove(shelf_id, book_id)
+        row = shelf_row(book_id)
+        if removed and row >= 0:
+            shelf_entry(shelf_id)['profile'].remove(row)
+    return jsonify({"removed": removed, "book_id": book_id})
+
+@app.route('/api/shelves/<shelf_id>/feed', methods=['GET'])
+@admission.limit
+def shelf_feed(shelf_id):
+    # Recomputed only when the shelf changed since the last feed, from a snapshot of the
+    # profile so the matrix product doesn't hold up other shelves' adds and removes
+    if not SHELF_ID.match(shelf_id): return jsonify({"error": "Invalid shelf id"}), 400
+    with shelf_profiles.lock:
+        entry = shelf_entry(shelf_id)
+        if entry['feed_version'] == entry['profile'].version:
+            return Response(entry['feed'], mimetype='application/json')
+        profile = entry['profile'].copy()
+    rows = profile.top(candidate_depth(N_PROFILE_RECOMMENDATIONS))
+    ids = catalog_ids_of(rows)
+    shelved = catalog_ids_of(np.fromiter(profile.weights, dtype=np.int64))
+    recommended = deduplicated(ids[ids >= 0], shelved)[:N_PROFILE_RECOMMENDATIONS]
+    feed = json_object([
+        ("recommendations", json_array([book_json(i) for i in recommended])),
+        ("source", dumps('collaborative')),
+    ])
+    with shelf_profiles.lock:
+        # A concurrent request may have stored a feed for a newer version meanwhile
+        if entry['feed_version'] < profile.version:
+            entry['feed'], entry['feed_version'] = feed, profile.version
+    return Response(feed, mimetype='application/json')
+
+def session_ranking(session):
+    """The session's ranked catalog ids (already scored; this is a partial sort),
+    kept until the session changes so paging through it is slicing. Call with
+    the session's lock held."""
+    profile = session['profile']
+    if session.get('ranked_version') != profile.version:
+        rows = profile.top(neighbor_ids.shape[1] + len(session['books']))
+        ids = catalog_ids_of(rows)
+        session['ranked'] = deduplicated(ids[ids >= 0], session['books'])
+        session['ranked_version'] = profile.version
+    return session['ranked']
+
+def session_response(session, page=(0, N_PROFILE_RECOMMENDATIONS, False)):
+    """The session's books and a page of its current recommendations."""
+    with session['lock']:
+        recommended, next_cursor = page_of(session_ranking(session), page)
+        books = list(session['books'])
+    return Response(json_object([
+        ("session_id", dumps(session['id'])),
+        ("books", json_array([listed_book_json(i) for i in books])),
+        ("recommendations", json_array([book_json(i) for i in recommended])),
+        ("source", dumps('collaborative')),
+    ] + ([("next_cursor", dumps(next_cursor))] if page[2] else [])), mimetype='application/json')
+
+def session_not_found():
+    return jsonify({"error": "Session not found or expired"}), 404
+
+@app.route('/api/taste_sessions', methods=['POST'])
+@admission.limit
+def start_taste_session():
+    session_id = uuid.uuid4().hex
+    session = {"id": session_id, "books": [], "lock": threading.Lock(),
+               "profile": TasteProfile(book_sparse, book_norms, by_user=user_ratings)}
+    taste_sessions.put(session_id, session)
+    return session_response(session)
+
+@app.route('/api/taste_sessions/<session_id>', methods=['GET'])
+def get_taste_session(session_id):
+    # ?limit= / ?cursor= page through the session's ranking as of its last change
+    session = taste_sessions.get(session_id)
+    if session is None: return session_not_found()
+    try:
+        page = page_request(request.args, N_PROFILE_RECOMMENDATIONS)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    return session_response(session, page)
+
+@app.route('/api/taste_sessions/<session_id>/books', methods=['POST'])
+def add_to_taste_session(session_id):
+    # Same matching as /api/recommend: {"title": "..."} or {"book_id": ...}
+    session = taste_sessions.get(session_id)
+    if session is None: return session_not_found()
+    data = request.json or {}
+    if not isinstance(data, dict): return jsonify({"error": "Expected a JSON object"}), 400
+    if data.get('book_id') is not None:
+        catalog_id = find_book_by_id(data['book_id'])
+    elif data.get('title'):
+        catalog_id = find_book(data['title'])
+    else:
+        return jsonify({"error": "No book_id or title provided"}), 400
+    if catalog_id is None: return jsonify({"error": "Book not found"})
+
+    with session['lock']:
+        if catalog_id not in session['books']:
+            session['books'].append(catalog_id)
+            row = int(catalog_cf_rows[catalog_id])
+            if row >= 0: session['profile'].add(row)
+    return session_response(session)
+
+@app.route('/api/taste_sessions/<session_id>/books/<int:book_id>', methods=['DELETE'])
+def remove_from_taste_session(session_id, book_id):
+    session = taste_sessions.get(session_id)
+    if session is None: return session_not_found()
+    catalog_id = find_book_by_id(book_id)
+    with session['lock']:
+        if catalog_id in session['books']:
+            session['books'].remove(catalog_id)
+            row = int(catalog_cf_rows[catalog_id])
+            if row >= 0: session['profile'].remove(row)
+    return session_response(session)
+
+@app.route('/api/taste_sessions/<session_id>', methods=['DELETE'])
+def end_taste_session(session_id):
+    if taste_sessions.pop(session_id) is None: return session_not_found()
+    return jsonify({"ended": session_id})
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    return jsonify({"admission": admission.snapshot(), "taste_sessions": len(taste_sessions),
+                    "cached_shelves": len(shelf_profiles)})
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+import time
+
+MANIFEST = 'artifacts.json'
+
+# Everything setup_model.py writes that the server reads
+ARTIFACT_FILES = [
+    'book_sparse.pkl',
+    'book_names.pkl',
+    'book_norms.npy',
+    'book_neighbors.npy',
+    'book_neighbor_sims.npy',
+    'user_ids.npy',
+    'books_metadata.pkl',
+    'book_fragments.bin',
+    'book_fragments.bin.idx.npy',
+    'cf_catalog_ids.npy',
+]
+
+
+# Written only when the matching engine is built (see setup_model.py flags)
+OPTIONAL_ARTIFACT_FILES = [
+    'book_readers_indptr.npy',
+    'book_readers.npy',
+    'content_neighbors.npy',
+    'content_neighbor_sims.npy',
+    'als_item_factors.npy',
+    'als_user_factors.npy',
+    'als_params.npy',
+    'book_clusters.npy',
+    'author_names.npy',
+    'author_neighbors.npy',
+    'author_neighbor_sims.npy',
+]
+
+# Bump when the layout of the files above changes
+ARTIFACT_FORMAT = 4
+
+
+def write_manifest(paths=ARTIFACT_FILES, build_key=None):
+    """Record the version of the freshly built artifacts.
+
+    `build_key` identifies the build's inputs (the pipeline's stage keys), so
+    rebuilding the same data gives the same version. Without one, the files
+    themselves are hashed.
+    """
+    digest = hashlib.sha256(f"format-{ARTIFACT_FORMAT}".encode('utf-8'))
+    if build_key is not None:
+        digest.update(build_key.encode('utf-8'))
+    else:
+        for path in sorted(paths):
+            digest.update(path.encode('utf-8'))
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+    manifest = {
+        "version": digest.hexdigest()[:16],
+        "built_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "files": sorted(paths),
+    }
+    with open(MANIFEST, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_version(paths=ARTIFACT_FILES):
+    """Version of the artifacts on disk.
+
+    Falls back to a hash of file sizes and mtimes for builds that predate
+    the manifest, which still changes whenever setup_model.py is re-run.
+    """
+    try:
+        with open(MANIFEST) as f:
+            return json.load(f)['version']
+    except (FileNotFoundError, KeyError, ValueError):
+        digest = hashlib.sha256()
+        for path in sorted(paths):
+            if os.path.exists(path):
+                stat = os.stat(path)
+                digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+        return digest.hexdigest()[:16]
@@ -0,0 +1,52 @@
+"""Author similarity: author vectors built from book vectors, and a name lookup.
+
+An author's vector is the sum of the L2-normalized matrix rows of their
+books (first-listed author, as elsewhere), so each book counts once however
+many ratings it has. One sparse product with an author x book indicator
+matrix builds every author's vector; setup_model.py --authors precomputes
+their top neighbors, so serving is a lookup.
+"""
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process, utils
+from scipy.sparse import csr_matrix
+
+from matching import MIN_SCORE
+from similarity import as_float, inverse_norms
+
+
+def author_matrix(book_sparse, norms, row_authors):
+    """(author vectors, author names) from the first-listed author of each matrix row."""
+    row_authors = pd.Series(row_authors, dtype=object)
+    codes, names = pd.factorize(row_authors.mask(row_authors.fillna('') == ''))   # no author -> -1
+    rows = np.flatnonzero(codes >= 0)
+    indicator = csr_matrix((inverse_norms(norms)[rows], (codes[rows], rows)),
+                           shape=(len(names), book_sparse.shape[0]), dtype=np.float32)
+    return (indicator @ as_float(book_sparse)).tocsr(), list(names)
+
+
+class AuthorIndex:
+    """Author names and their precomputed neighbors, loaded once at server start."""
+
+    def __init__(self, names, neighbor_ids, neighbor_sims):
+        self.names = names
+        self.neighbor_ids = neighbor_ids
+        self.neighbor_sims = neighbor_sims
+        self.by_key = {}
+        for i, name in enumerate(names):
+            self.by_key.setdefault(utils.default_process(name), i)
+        self.keys = list(self.by_key)
+
+    def find(self, name):
+        """Index of an author: exact up to case and punctuation, else fuzzy; None if no match."""
+        key = utils.default_process(name)
+        if key in self.by_key:
+            return self.by_key[key]
+        match = process.extractOne(key, self.keys, scorer=fuzz.WRatio, processor=None, score_cutoff=MIN_SCORE)
+        return self.by_key[match[0]] if match else None
+
+    def similar(self, author, n):
+        """[(author index, similarity)] of the n most similar authors, best first."""
+        ids, sims = self.neighbor_ids[author], self.neighbor_sims[author]
+        keep = (ids >= 0) & np.isfinite(sims) & (sims > 0)
+        return list(zip(ids[keep][:n].tolist(), sims[keep][:n].tolist()))
@@ -0,0 +1,47 @@
+"""Measure serving latency against whatever artifacts are in the current directory.
+
+    python generate_synthetic.py --out data_synth && python setup_model.py --data-dir data_synth
+    python benchmark.py --queries 500
+
+Requests go through Flask's test client, so the numbers are handler cost
+without network or WSGI server overhead.
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+
+def measure(label, call, payloads):
+    timings = []
+    for payload in payloads:
+        start = time.perf_counter()
+        response = call(payload)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    ms = np.array(timings) * 1000
+    print(f"{label:<22} n={len(ms):<6} p50={np.percentile(ms, 50):7.2f}ms "
+          f"p95={np.percentile(ms, 95):7.2f}ms p99={np.percentile(ms, 99):7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serving latency benchmark")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--taste-size', type=int, default=5, help="titles per taste test")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    import app as server  # loads the artifacts
+    client = server.app.test_client()
+    rng = random.Random(args.seed)
+    titles = [rng.choice(server.book_names) for _ in range(args.queries)]
+
+    measure("POST /api/recommend", lambda t: client.post('/api/recommend', json={"book_name": t}), titles)
+    measure("GET /api/recommend", lambda t: client.get('/api/recommend', query_string={"title": t}), titles)
+    tastes = [[rng.choice(server.book_names) for _ in range(args.taste_size)] for _ in range(args.queries)]
+    measure("POST /api/taste_test", lambda b: client.post('/api/taste_test', json={"books": b}), tastes)
+
+
+if __name__ == '__main__':
+    main()
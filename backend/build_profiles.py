@@ -0,0 +1,125 @@
+"""Pick the activity thresholds from a memory budget.
+
+Instead of guessing `--min-user-ratings` / `--min-book-ratings`, pass
+`--profile` (or `--memory-budget 3GB`) to setup_model.py: the planner walks
+a ladder of thresholds from most to least inclusive and takes the first one
+whose server (with the enabled engines) fits the budget, reporting what the
+cut costs.
+"""
+import numpy as np
+
+PROFILES = {
+    'small': 256 * 2**20,
+    'medium': 1 * 2**30,
+    'large': 4 * 2**30,
+}
+
+# Tried in order; the first (most inclusive) setting that fits wins
+THRESHOLD_LADDER = [1, 2, 3, 5, 10, 15, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000]
+
+# Rough per-row costs of the artifacts that are not the matrix itself
+NAME_BYTES = 64           # book_names.pkl entry
+INDEX_BYTES = 4           # int32 indices / indptr
+CATALOG_BYTES = 1024      # metadata row, JSON fragment and lookup dicts per catalog title
+
+
+def parse_size(text):
+    """'512MB', '2GB', '1.5G' or plain bytes -> bytes."""
+    text = text.strip().upper().rstrip('B')
+    units = {'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def storage_dtype(ratings):
+    """int8 when every rating is a small integer (goodbooks: 1-5 stars), else float32."""
+    values = ratings.to_numpy()
+    if np.issubdtype(values.dtype, np.integer) or np.array_equal(values, np.round(values)):
+        if len(values) == 0 or (values.min() >= -128 and values.max() <= 127):
+            return 'int8'
+    return 'float32'
+
+
+def estimate_bytes(n_books, n_users, nnz, dtype, k, engines=None, n_catalog=0):
+    """Approximate peak memory of the server for a matrix of this shape.
+
+    Counts what app.py holds once started:
+    - the matrix twice (book_sparse, and user_ratings by user), plus the
+      transient float32 copy of its data that scipy makes for a shelf feed;
+    - the neighbor table, norms, names and user ids;
+    - per catalog title (`n_catalog`), its metadata and JSON fragment;
+    - for each engine enabled in `engines`: reader sets (both directions,
+      counting rated reads only; --to-read shelves come on top), the ALS
+      item factors, content neighbors and cluster ids per catalog title,
+      and the author index (at most one author per book).
+    MinHash signatures and the ALS user factors only exist during the
+    build and are not counted; neither is the interpreter and its libraries.
+    """
+    engines = engines or {}
+    itemsize = np.dtype(dtype).itemsize
+    matrix = nnz * (itemsize + INDEX_BYTES) + (n_books + 1) * INDEX_BYTES
+    user_ratings = nnz * (itemsize + INDEX_BYTES) + (n_users + 1) * INDEX_BYTES
+    feed_copy = nnz * 4                      # int8 matrix @ float32 vector upcasts the data
+    neighbor_table = n_books * k * (4 + 4)   # int32 ids + float32 similarities
+    per_book = n_books * (4 + NAME_BYTES)    # norms + names
+    per_user = n_users * 8                   # user_ids
+    catalog = n_catalog * CATALOG_BYTES
+    total = matrix + user_ratings + feed_copy + neighbor_table + per_book + per_user + catalog
+
+    if engines.get('reader_sets'):
+        # int32 reads by book and by user, int64 indptrs and per-book counts
+        total += nnz * 2 * INDEX_BYTES + (n_books + 1) * 16 + (n_users + 1) * 8
+    if engines.get('als_factors'):
+        total += n_books * engines['als_factors'] * 4
+    if engines.get('content_k'):
+        total += n_catalog * engines['content_k'] * (4 + 4)
+    if engines.get('clusters'):
+        total += n_catalog * 4
+    if engines.get('author_k'):
+        total += n_books * (engines['author_k'] * (4 + 4) + NAME_BYTES)
+    return total
+
+
+def apply_thresholds(user_ids, book_ids, min_user, min_book):
+    """Same two-step filter as setup_model.py, on bare id arrays."""
+    users, user_inverse, user_counts = np.unique(user_ids, return_inverse=True, return_counts=True)
+    keep = user_counts[user_inverse] >= min_user
+    books, book_inverse, book_counts = np.unique(book_ids[keep], return_inverse=True, return_counts=True)
+    keep_books = book_counts[book_inverse] >= min_book
+    return (int(keep_books.sum()),
+            int(len(np.unique(user_ids[keep][keep_books]))),
+            int((book_counts >= min_book).sum()))
+
+
+def plan(ratings, budget, k, engines=None, n_catalog=0):
+    """Choose thresholds so the server fits in `budget` bytes (see estimate_bytes).
+
+    Returns a dict with the choice, its size estimate and its coverage.
+    """
+    user_ids = ratings['user_id'].to_numpy()
+    book_ids = ratings['book_id'].to_numpy()
+    total = {"ratings": len(user_ids), "users": int(len(np.unique(user_ids))),
+             "books": int(len(np.unique(book_ids)))}
+
+    dtype = storage_dtype(ratings['rating'])
+
+    for threshold in THRESHOLD_LADDER:
+        nnz, n_users, n_books = apply_thresholds(user_ids, book_ids, threshold, threshold)
+        if n_books < 2:
+            break  # nothing left to recommend between
+        estimate = estimate_bytes(n_books, n_users, nnz, dtype, k, engines, n_catalog)
+        if estimate <= budget:
+            return {
+                "min_user_ratings": threshold,
+                "min_book_ratings": threshold,
+                "dtype": dtype,
+                "budget_bytes": budget,
+                "estimated_bytes": estimate,
+                "kept": {"ratings": nnz, "users": n_users, "books": n_books},
+                "dropped": {"ratings": total['ratings'] - nnz, "users": total['users'] - n_users,
+                            "books": total['books'] - n_books},
+                "coverage": {key: round(kept / max(total[key], 1), 4)
+                             for key, kept in (("ratings", nnz), ("users", n_users), ("books", n_books))},
+            }
+    raise ValueError(f"No threshold leaves a usable catalog within a budget of {budget:,} bytes")
@@ -0,0 +1,70 @@
+"""Series and edition clusters, so result lists don't spend slots on near-duplicates.
+
+Two catalog books are linked if they have the same first-listed author and
+- the same normalized title (editions that differ in case, punctuation,
+  a subtitle or a parenthetical), or
+- the same series in goodbooks' full title ("Catching Fire (The Hunger
+  Games, #2)"), or
+- a collaborative similarity of at least `threshold` (boxed sets and
+  omnibus editions, whose titles no rule above catches).
+Clusters are the connected components of those links, numbered per catalog
+id, so the server dedupes a list with an int array lookup.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import utils
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+SERIES = re.compile(r'\(([^()]*?),?\s*#[^()]*\)\s*$')
+PARENTHETICAL = re.compile(r'\s*\([^()]*\)\s*$')
+
+
+def first_author(authors):
+    return str(authors).split(',')[0].strip().lower()
+
+
+def normalize_title(title):
+    """'The Hobbit: or There and Back Again (Illustrated)' -> 'the hobbit'."""
+    title = PARENTHETICAL.sub('', str(title)).split(':')[0]
+    return utils.default_process(title)
+
+
+def series_name(full_title):
+    """'Catching Fire (The Hunger Games, #2)' -> 'the hunger games', '' if not in a series."""
+    match = SERIES.search(str(full_title))
+    return utils.default_process(match.group(1)) if match else ''
+
+
+def _links_by_key(keys):
+    """(a, b) arrays linking each row to the first row with the same non-empty key."""
+    keys = pd.Series(keys)
+    codes = pd.factorize(keys.mask(keys == ''))[0]   # empty keys -> -1
+    rows = np.flatnonzero(codes >= 0)
+    _, first = np.unique(codes[rows], return_index=True)   # codes are 0..k-1 in order of appearance
+    return rows, rows[first[codes[rows]]]
+
+
+def book_clusters(authors, titles, full_titles, similar_pairs=None):
+    """Cluster id (int32) per catalog book.
+
+    `similar_pairs` is an (a, b) pair of catalog id arrays whose
+    collaborative similarity cleared the threshold.
+    """
+    n = len(authors)
+    authors = pd.Series([first_author(name) for name in authors])
+    by_title = authors + '|' + pd.Series([normalize_title(title) for title in titles])
+    series = pd.Series([series_name(title) for title in full_titles])
+    by_series = (authors + '|' + series).where(series != '', '')
+    links = [_links_by_key(by_title), _links_by_key(by_series)]
+    if similar_pairs is not None:
+        a, b = (np.asarray(side, dtype=np.int64) for side in similar_pairs)
+        same_author = authors.to_numpy()[a] == authors.to_numpy()[b]
+        links.append((a[same_author], b[same_author]))
+    a = np.concatenate([pair[0] for pair in links])
+    b = np.concatenate([pair[1] for pair in links])
+    graph = coo_matrix((np.ones(len(a), dtype=np.int8), (a, b)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    return labels.astype(np.int32)
@@ -0,0 +1,49 @@
+"""Content engine: TF-IDF over title words, authors and goodbooks tags.
+
+Unlike the collaborative matrix, which only has rows for books that clear the
+rating thresholds, this index covers the whole catalog (one row per catalog
+id, i.e. `books_metadata.drop_duplicates('title')` order), so long-tail books
+get neighbors too. Each field is vectorized on its own, weighted, stacked and
+L2-normalized, so a dot product is a cosine similarity.
+"""
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, hstack
+from sklearn.feature_extraction.text import TfidfTransformer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+FIELD_WEIGHTS = {"title": 1.0, "authors": 1.0, "tags": 1.0}
+
+# Shelf names that say nothing about the book itself
+GENERIC_TAGS = {'to-read', 'currently-reading', 'favorites', 'owned', 'books-i-own', 'default', 'my-books',
+                'library', 'to-buy', 'wish-list', 'kindle', 'ebook', 'owned-books', 'i-own', 'read'}
+
+
+def split_authors(authors):
+    """'J.K. Rowling, Mary GrandPré' -> ['j.k. rowling', 'mary grandpré'] (one token per author)."""
+    return [name.strip().lower() for name in str(authors).split(',') if name.strip()]
+
+
+def tag_counts(goodreads_ids, book_tags, tags):
+    """(n_books, n_tags) matrix of how often each book was shelved under each tag."""
+    tags = tags[~tags['tag_name'].isin(GENERIC_TAGS)]
+    shelved = book_tags.merge(tags, on='tag_id')
+    rows = pd.Index(goodreads_ids).get_indexer(shelved['goodreads_book_id'])
+    keep = rows >= 0
+    cols = pd.Index(tags['tag_id']).get_indexer(shelved['tag_id'][keep])
+    counts = shelved['count'].to_numpy(dtype=np.float32)[keep].clip(min=0)
+    return csr_matrix((counts, (rows[keep], cols)), shape=(len(goodreads_ids), len(tags)))
+
+
+def content_matrix(catalog, goodreads_ids=None, book_tags=None, tags=None, weights=FIELD_WEIGHTS):
+    """L2-normalized TF-IDF rows for each catalog entry."""
+    fields = [
+        weights['title'] * TfidfVectorizer(stop_words='english', sublinear_tf=True).fit_transform(
+            catalog['title'].astype(str)),
+        weights['authors'] * TfidfVectorizer(tokenizer=split_authors, lowercase=False, token_pattern=None).fit_transform(
+            catalog['authors'].fillna('')),
+    ]
+    if book_tags is not None and tags is not None:
+        counts = tag_counts(goodreads_ids, book_tags, tags)
+        fields.append(weights['tags'] * TfidfTransformer(sublinear_tf=True).fit_transform(counts))
+    return normalize(hstack(fields).tocsr().astype(np.float32))
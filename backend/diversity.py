@@ -0,0 +1,63 @@
+"""Diversity re-ranking with maximal marginal relevance (Carbonell & Goldstein 1998).
+
+Given a short list of candidates with relevance scores and their pairwise
+similarities, picks greedily the candidate maximizing
+
+    (1 - diversity) * relevance - diversity * (max similarity to the picks so far)
+
+so a run of near-identical books (the rest of a series) gets interleaved
+with other good matches. All pairwise similarities are computed up front
+(one small matrix product, or lookups in the neighbor table), and each pick
+updates the running maxima with one row.
+"""
+import numpy as np
+
+
+def pairwise_cosines(vectors):
+    """(n, n) cosine similarities of n dense vectors (zero vectors score 0)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1)
+    vectors = vectors / np.where(norms > 0, norms, 1)[:, None]
+    return vectors @ vectors.T
+
+
+def table_similarities(rows, neighbor_ids, neighbor_sims):
+    """(n, n) cosine similarities of matrix rows `rows` read off the neighbor table.
+
+    Pairs beyond the table's depth score 0, as do rows < 0 (books without a
+    matrix row). One sorted lookup over the candidates' lists, so this costs
+    O(n x k) instead of a product over the users.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    n = len(rows)
+    order = np.argsort(rows, kind='stable')
+    ordered = rows[order]
+    lists = neighbor_ids[rows.clip(0)]
+    position = np.searchsorted(ordered, lists).clip(max=n - 1)
+    hit = (ordered[position] == lists) & (lists >= 0) & (rows >= 0)[:, None]
+    i, j = np.nonzero(hit)
+    similarity = np.zeros((n, n), dtype=np.float32)
+    similarity[i, order[position[i, j]]] = neighbor_sims[rows[i], j]
+    return np.maximum(similarity, similarity.T)   # top-k lists need not be symmetric
+
+
+def mmr(relevance, similarity, n, diversity):
+    """Indices of the first n candidates in MMR order.
+
+    `relevance` is scaled by its maximum so that engines with different
+    score ranges trade off against cosine similarity the same way.
+    """
+    relevance = np.asarray(relevance, dtype=np.float64)
+    top = relevance.max() if len(relevance) else 0.0
+    if top > 0:
+        relevance = relevance / top
+    available = np.ones(len(relevance), dtype=bool)
+    redundancy = np.zeros(len(relevance))
+    picked = []
+    for _ in range(min(n, len(relevance))):
+        score = np.where(available, (1 - diversity) * relevance - diversity * redundancy, -np.inf)
+        best = int(np.argmax(score))
+        picked.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return np.array(picked, dtype=np.int64)
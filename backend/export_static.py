@@ -0,0 +1,107 @@
+"""Write every book's recommendations as static JSON for CDN serving.
+
+Run after setup_model.py:
+
+    python export_static.py --out static
+
+Layout (shard = first two hex chars of md5(key)):
+
+    static/manifest.json
+    static/books/<shard>/<book_id>.json
+    static/slugs/<shard>/<slug>.json
+
+Every catalog title gets a file, cold-start books included, and each file
+holds exactly what GET /api/recommend?id=<book_id> returns: the workers
+import app.py and call the same functions the route does.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+import app as api
+from artifacts import read_version
+
+
+def slugify(title):
+    text = unicodedata.normalize('NFKD', str(title)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-') or 'book'
+
+
+def shard_path(kind, key):
+    shard = hashlib.md5(str(key).encode('utf-8')).hexdigest()[:2]
+    return f"{kind}/{shard}/{key}.json"
+
+
+# --- Worker side: app.py loaded the artifacts at import (forked workers share the parent's) ---
+_worker = {}
+
+
+def _init_worker(out_dir, paths):
+    _worker['out_dir'] = out_dir
+    _worker['paths'] = paths
+
+
+def _export_books(catalog_ids):
+    with api.app.app_context():  # jsonify, for the API's error bodies
+        for catalog_id in catalog_ids:
+            body = api.recommend_response(api.recommendations_for(catalog_id)).get_data()
+            for rel_path in _worker['paths'][catalog_id]:
+                path = os.path.join(_worker['out_dir'], rel_path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(body)
+    return len(catalog_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', default='static', help="output directory (default: static)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument('--chunk-size', type=int, default=256, help="books per worker task")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    print("--- 1. LISTING CATALOG ---")
+    catalog_book_ids = api.catalog['book_id'].tolist()
+    catalog_ids = list(range(len(api.catalog_titles)))
+    entries, paths, taken = [], {}, set()
+    for catalog_id in catalog_ids:
+        book_id, title = int(catalog_book_ids[catalog_id]), api.catalog_titles[catalog_id]
+        slug = slugify(title)
+        if slug in taken:
+            slug = f"{slug}-{book_id}"
+        taken.add(slug)
+        paths[catalog_id] = [shard_path('books', book_id), shard_path('slugs', slug)]
+        entries.append({"id": book_id, "slug": slug, "title": title, "path": paths[catalog_id][0]})
+
+    print(f"--- 2. WRITING {len(catalog_ids)} BOOKS ({args.workers} workers) ---")
+    chunks = [catalog_ids[i:i + args.chunk_size] for i in range(0, len(catalog_ids), args.chunk_size)]
+    written = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.out, paths)) as pool:
+        for count in pool.map(_export_books, chunks):
+            written += count
+
+    print("--- 3. WRITING MANIFEST ---")
+    # Written last so a half-finished export never advertises missing files
+    manifest = {
+        "version": read_version(),
+        "generated_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "by_id": "books/{shard}/{id}.json",
+        "by_slug": "slugs/{shard}/{slug}.json",
+        "shard": "first two hex chars of md5(id or slug)",
+        "books": entries,
+    }
+    with open(os.path.join(args.out, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+    print(f"SUCCESS! Exported {written} books to {args.out}/ in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import json
+import mmap
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback, same output shape just slower
+    orjson = None
+
+
+def dumps(obj):
+    """Serialize to JSON bytes with the fastest encoder available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def book_fragment(title, isbn, author, img_url, rating):
+    """The JSON object the API returns for one book, as bytes."""
+    return dumps({
+        "title": title,
+        "isbn": isbn,
+        "author": author,
+        "original_img": img_url,
+        "rating": rating,
+    })
+
+
+def catalog_fragments(catalog):
+    """One fragment per row of the de-duplicated metadata catalog."""
+    columns = zip(
+        catalog['title'].tolist(),
+        catalog['isbn'].tolist(),
+        catalog['authors'].tolist(),
+        catalog['img_url'].tolist(),
+        catalog['average_rating'].tolist(),
+    )
+    return [book_fragment(*row) for row in columns]
+
+
+def json_array(fragments):
+    return b'[' + b','.join(fragments) + b']'
+
+
+def json_object(pairs):
+    """Assemble {"key": <fragment>, ...} from already-encoded values."""
+    return b'{' + b','.join(dumps(key) + b':' + value for key, value in pairs) + b'}'
+
+
+def write_fragment_blob(path, fragments):
+    """Write fragments back to back into `path` plus `<path>.idx.npy` offsets.
+
+    Fragment i is blob[offsets[i]:offsets[i + 1]].
+    """
+    offsets = np.zeros(len(fragments) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(fragment) for fragment in fragments])
+    with open(path, 'wb') as f:
+        for fragment in fragments:
+            f.write(fragment)
+    np.save(path + '.idx.npy', offsets)
+
+
+class FragmentStore:
+    """Read-only, memory-mapped view over a blob written by write_fragment_blob."""
+
+    def __init__(self, path):
+        self.offsets = np.load(path + '.idx.npy').tolist()
+        with open(path, 'rb') as f:
+            # Zero-length files cannot be mapped; an empty catalog has no fragments anyway
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b''
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self._blob[self.offsets[i]:self.offsets[i + 1]]
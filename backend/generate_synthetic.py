@@ -0,0 +1,101 @@
+"""Generate a synthetic goodbooks-style dataset for scale testing.
+
+    python generate_synthetic.py --books 1000000 --users 5000000 --ratings 100000000 --out data_synth
+    python setup_model.py --data-dir data_synth
+
+Writes books.csv and ratings.csv with the columns setup_model.py reads.
+Book popularity follows a Zipf law and user activity a Pareto law, like the
+real data; ratings are written in user chunks so memory stays flat no matter
+how many are requested.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Share of 1..5 star ratings in goodbooks-10k
+RATING_SHARES = np.array([0.02, 0.06, 0.23, 0.36, 0.33])
+
+
+def write_books(path, n_books, n_authors, rng):
+    book_ids = np.arange(1, n_books + 1)
+    # A book's own average shifts its ratings up or down
+    quality = rng.normal(0, 0.35, n_books)
+    average_rating = np.clip(np.round(RATING_SHARES @ np.arange(1, 6) + quality, 2), 1, 5)
+    authors = rng.zipf(1.6, n_books) % n_authors
+    books = pd.DataFrame({
+        'book_id': book_ids,
+        'goodreads_book_id': book_ids + 1000,
+        'isbn': [f"{9 * 10**8 + i:09d}X" for i in book_ids],
+        'authors': [f"Synthetic Author {a}" for a in authors],
+        'original_title': [f"Synthetic Book {i}" for i in book_ids],
+        'title': [f"Synthetic Book {i} (Synthetic Series #{i % 7 + 1})" for i in book_ids],
+        'average_rating': average_rating,
+        'image_url': [f"https://images.example.com/{i}.jpg" for i in book_ids],
+    })
+    books.to_csv(path, index=False)
+    return quality
+
+
+def write_ratings(path, n_users, n_books, n_ratings, quality, rng, book_alpha, user_alpha, chunk_users):
+    # Popularity: book of rank r is drawn with weight 1 / r^alpha (ranks shuffled over ids)
+    weights = 1.0 / np.arange(1, n_books + 1) ** book_alpha
+    book_cdf = np.cumsum(weights[rng.permutation(n_books)])
+    book_cdf /= book_cdf[-1]
+
+    # Activity: Pareto-distributed ratings per user, scaled to the requested total
+    activity = rng.pareto(user_alpha, n_users) + 1
+    activity = np.clip(np.round(activity * n_ratings / activity.sum()), 1, n_books).astype(np.int64)
+
+    written = 0
+    with open(path, 'w', newline='') as f:
+        f.write('user_id,book_id,rating\n')
+        for start in range(0, n_users, chunk_users):
+            counts = activity[start:start + chunk_users]
+            users = np.repeat(np.arange(start + 1, start + 1 + len(counts), dtype=np.int64), counts)
+            books = np.searchsorted(book_cdf, rng.random(len(users)))
+            # One rating per (user, book): drop repeated draws
+            pairs = np.unique(users * n_books + books)
+            users, books = pairs // n_books, pairs % n_books
+            stars = np.searchsorted(np.cumsum(RATING_SHARES), rng.random(len(pairs))) + 1
+            stars = np.clip(np.round(stars + quality[books]), 1, 5).astype(np.int8)
+            pd.DataFrame({'user_id': users, 'book_id': books + 1, 'rating': stars}).to_csv(
+                f, header=False, index=False)
+            written += len(pairs)
+            print(f"  {min(start + chunk_users, n_users):,}/{n_users:,} users, {written:,} ratings")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic books.csv/ratings.csv")
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--ratings', type=int, default=6000000, help="approximate total ratings")
+    parser.add_argument('--authors', type=int, default=None, help="default: books / 4")
+    parser.add_argument('--book-alpha', type=float, default=0.9, help="Zipf exponent of book popularity")
+    parser.add_argument('--user-alpha', type=float, default=1.5, help="Pareto shape of user activity")
+    parser.add_argument('--chunk-users', type=int, default=100000, help="users generated per write")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='data_synth', help="output directory")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rng = np.random.default_rng(args.seed)
+    os.makedirs(args.out, exist_ok=True)
+
+    print("--- 1. WRITING BOOKS ---")
+    quality = write_books(os.path.join(args.out, 'books.csv'), args.books,
+                          args.authors or max(args.books // 4, 1), rng)
+
+    print("--- 2. WRITING RATINGS ---")
+    written = write_ratings(os.path.join(args.out, 'ratings.csv'), args.users, args.books, args.ratings,
+                            quality, rng, args.book_alpha, args.user_alpha, args.chunk_users)
+
+    print(f"SUCCESS! {args.books:,} books, {args.users:,} users, {written:,} ratings "
+          f"in {args.out}/ ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Match a Goodreads library export (My Books > Import/Export) to the catalog.
+
+Rows are resolved in order of cost: ISBN lookup, exact match on the
+normalized title (Goodreads appends "(Series, #n)", the catalog does not),
+then fuzzy matching for whatever is left. The fuzzy pass scores all
+remaining rows against the catalog in one multi-threaded `cdist` call with
+a cheap scorer, and only the shortlisted titles get the full WRatio score
+that `find_book` uses.
+"""
+import io
+import re
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process, utils
+
+from matching import MIN_SCORE
+
+SHORTLIST = 20      # catalog titles rescored with WRatio per unresolved row
+
+SERIES_SUFFIX = re.compile(r'\s*\([^()]*#[^()]*\)\s*$')
+
+COLUMNS = {'Title': 'title', 'ISBN': 'isbn', 'ISBN13': 'isbn13', 'My Rating': 'rating'}
+
+
+def normalize_title(title):
+    return utils.default_process(SERIES_SUFFIX.sub('', str(title)))
+
+
+def isbn10(value):
+    """Normalized ISBN-10 for an ISBN-10 or 978 ISBN-13 (Goodreads writes ="..."), else None."""
+    if isinstance(value, float):
+        value = f"{value:.0f}" if value == value else ''
+    digits = re.sub(r'[^0-9Xx]', '', str(value)).upper()
+    if len(digits) == 13 and digits.startswith('978'):
+        body = digits[3:12]
+        check = sum((10 - i) * int(d) for i, d in enumerate(body)) % 11
+        return body + ('X' if check == 1 else str((11 - check) % 11))
+    if 8 <= len(digits) <= 10:
+        return digits.zfill(10)  # pandas may have read the catalog's ISBNs as numbers
+    return None
+
+
+def read_export(data):
+    """The columns we use from a Goodreads CSV export, as strings/ints."""
+    library = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+    if 'Title' not in library.columns:
+        raise ValueError("Not a Goodreads export: no 'Title' column")
+    library = library.reindex(columns=list(COLUMNS), fill_value='').rename(columns=COLUMNS)
+    library['rating'] = pd.to_numeric(library['rating'], errors='coerce').fillna(0).astype(int)
+    return library
+
+
+class CatalogMatcher:
+    """Lookup tables over the catalog, built once at server start."""
+
+    def __init__(self, titles, isbns):
+        self.processed = [normalize_title(title) for title in titles]
+        self.by_title, self.by_isbn = {}, {}
+        for catalog_id, (title, isbn) in enumerate(zip(self.processed, isbns)):
+            self.by_title.setdefault(title, catalog_id)
+            key = isbn10(isbn)
+            if key:
+                self.by_isbn.setdefault(key, catalog_id)
+
+    def resolve(self, titles, isbns, isbn13s):
+        """Catalog id per row (-1 if unresolved) and how it was matched."""
+        catalog_ids = np.full(len(titles), -1, dtype=np.int64)
+        methods = [None] * len(titles)
+        pending = []
+        for i, (title, isbn, isbn13) in enumerate(zip(titles, isbns, isbn13s)):
+            for key in (isbn10(isbn), isbn10(isbn13)):
+                if key in self.by_isbn:
+                    catalog_ids[i], methods[i] = self.by_isbn[key], 'isbn'
+                    break
+            else:
+                normalized = normalize_title(title)
+                if normalized in self.by_title:
+                    catalog_ids[i], methods[i] = self.by_title[normalized], 'title'
+                elif normalized:
+                    pending.append((i, normalized))
+
+        if pending:
+            queries = [normalized for _, normalized in pending]
+            # Cheap scorer over the whole catalog, all rows at once on every core
+            rough = process.cdist(queries, self.processed, scorer=fuzz.ratio, workers=-1, dtype=np.uint8)
+            keep = min(SHORTLIST, rough.shape[1])
+            shortlist = np.argpartition(rough, -keep, axis=1)[:, -keep:]
+            for (i, query), candidates in zip(pending, shortlist):
+                match = process.extractOne(query, [self.processed[c] for c in candidates], scorer=fuzz.WRatio,
+                                           processor=None, score_cutoff=MIN_SCORE)
+                if match:
+                    catalog_ids[i], methods[i] = int(candidates[match[2]]), 'fuzzy'
+        return catalog_ids, methods
@@ -0,0 +1,8 @@
+"""Fuzzy title and name matching settings shared by the lookups.
+
+app.find_book, the Goodreads import and the author lookup all score with
+WRatio; they take a match only at MIN_SCORE or above, so a title that
+resolves in one place resolves in the others.
+"""
+
+MIN_SCORE = 60      # WRatio cutoff, lowered slightly for better UX
@@ -0,0 +1,211 @@
+"""MinHash + banded LSH candidate generation for the neighbor table.
+
+Exact neighbors score every pair of books, which is quadratic. Here each
+book's reader set gets a MinHash signature; books whose signatures agree on
+all rows of at least one band land in the same bucket, and only those
+candidate pairs are scored with exact cosine. Two books with reader-set
+Jaccard J collide with probability 1 - (1 - J^r)^b for b bands of r rows,
+which rises steeply around the threshold (1/b)^(1/r). Books that share
+readers typically have J of only 0.02-0.05 (a few hundred shared readers
+out of thousands), so the default is 64 bands of one row each, a threshold
+of ~0.016: a J = 0.05 pair collides with 96% probability, J = 0.02 with
+73%. That low a threshold puts most books that share any readers into
+some bucket together, so candidates are bounded two ways: large buckets
+are only paired within a sliding window (in random order), and each book
+keeps only the `max_candidates` pairs with the most band votes. Scored
+pairs therefore grow with books x cap, not books^2, and each is scored
+with a sparse row dot product.
+"""
+import numpy as np
+
+from similarity import inverse_norms, top_k_neighbors
+
+EMPTY = np.iinfo(np.uint32).max  # signature of a book with no readers
+
+
+def signatures(matrix, n_hashes, seed=0):
+    """(n_rows, n_hashes) uint32 MinHash signatures of each row's column set.
+
+    Hash j maps column c to the top 32 bits of a_j * c + b_j (mod 2^64,
+    multiply-shift); a row's signature is the minimum over its columns,
+    taken for all rows at once with reduceat, one hash at a time.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**63, n_hashes, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, n_hashes, dtype=np.uint64)
+
+    n_rows = matrix.shape[0]
+    sigs = np.full((n_rows, n_hashes), EMPTY, dtype=np.uint32)
+    non_empty = np.flatnonzero(np.diff(matrix.indptr) > 0)
+    starts = matrix.indptr[:-1][non_empty]
+    cols = matrix.indices.astype(np.uint64)
+    hashed = np.empty_like(cols)
+    for j in range(n_hashes):
+        np.multiply(cols, a[j], out=hashed)
+        hashed += b[j]
+        hashed >>= np.uint64(32)
+        sigs[non_empty, j] = np.minimum.reduceat(hashed, starts)
+    return sigs
+
+
+def band_threshold(n_hashes, bands):
+    """Jaccard at which a pair's collision probability rises fastest, ~(1/b)^(1/r)."""
+    return (1.0 / bands) ** (bands / n_hashes)
+
+
+def check_bands(n_hashes, bands):
+    if not 1 <= bands <= n_hashes or n_hashes % bands:
+        raise ValueError(f"bands ({bands}) must divide the signature length ({n_hashes})")
+
+
+def _window_pairs(members, group_sizes, window):
+    """(i, j) pairs of each member with up to `window` members after it in its group."""
+    group_ends = np.repeat(np.cumsum(group_sizes), group_sizes)
+    position = np.arange(len(members))
+    later = np.minimum(group_ends - position - 1, window)
+    left = np.repeat(position, later)
+    run_starts = np.repeat(np.cumsum(later) - later, later)
+    right = left + (np.arange(len(left)) - run_starts) + 1
+    return members[left], members[right]
+
+
+def _cap_per_row(n_rows, pairs, scores, cap):
+    """Keep a pair if it is among the `cap` best-scoring pairs of either of its rows."""
+    # One int64 sort over both ends: row in the high bits, descending score (quantized) below it
+    rank_bits = np.int64(2**20)
+    worst = rank_bits - 1 - np.round(scores / max(scores.max(), 1e-12) * (rank_bits - 1)).astype(np.int64)
+    keys = np.concatenate([(pairs // n_rows) * rank_bits + worst, (pairs % n_rows) * rank_bits + worst])
+    del worst
+    order = np.argsort(keys)
+    src = keys[order] // rank_bits
+    del keys
+    rank = np.arange(len(src)) - np.searchsorted(src, src, side='left')
+    keep = np.zeros(len(pairs), dtype=bool)
+    keep[order[rank < cap] % len(pairs)] = True
+    return pairs[keep]
+
+
+def candidate_pairs(sigs, bands, sizes=None, window=16, max_candidates=400, seed=1):
+    """Unique (a, b) row pairs, a < b, that share a bucket in some band.
+
+    Within a bucket (in a random order that changes per band) each row is
+    paired with the next `window` rows only, so a band adds at most
+    n_rows x window pairs however big its buckets are. The share of bands a
+    pair collided in estimates its Jaccard J; with the rows' reader counts
+    `sizes` that gives an estimated cosine (|A n B| / sqrt(|A| |B|), with
+    |A n B| = J (|A| + |B|) / (1 + J)). Each row keeps its `max_candidates`
+    best pairs, so the pairs scored grow with n_rows x max_candidates, not
+    n_rows^2.
+    """
+    n_rows, n_hashes = sigs.shape
+    check_bands(n_hashes, bands)
+    rows_per_band = n_hashes // bands
+    rng = np.random.default_rng(seed)
+    mix = rng.integers(1, 2**63, rows_per_band, dtype=np.uint64) | np.uint64(1)
+    has_readers = np.flatnonzero((sigs != EMPTY).any(axis=1))
+    parts = []
+    for band in range(bands):
+        band_sigs = sigs[has_readers, band * rows_per_band:(band + 1) * rows_per_band].astype(np.uint64)
+        bucket = (band_sigs * mix).sum(axis=1)  # wraps mod 2^64, collisions only add candidates
+        order = np.lexsort((rng.random(len(bucket)), bucket))
+        _, bucket_sizes = np.unique(bucket[order], return_counts=True)
+        left, right = _window_pairs(has_readers[order], bucket_sizes, window)
+        parts.append(np.minimum(left, right) * n_rows + np.maximum(left, right))
+    # Unique pairs and how many bands each collided in (sorted in place, then run lengths)
+    pairs = np.concatenate(parts)
+    del parts
+    pairs.sort()
+    starts = np.flatnonzero(np.concatenate([[True], pairs[1:] != pairs[:-1]]))
+    votes = np.diff(np.append(starts, len(pairs)))
+    pairs = pairs[starts]
+    scores = votes / bands
+    if sizes is not None:
+        a, b = sizes[pairs // n_rows].astype(np.float64), sizes[pairs % n_rows].astype(np.float64)
+        scores = scores * (a + b) / (1 + scores) / np.sqrt(a * b)
+    pairs = _cap_per_row(n_rows, pairs, scores, max_candidates)
+    return pairs // n_rows, pairs % n_rows
+
+
+def pair_cosines(matrix, norms, a, b, dense_budget=1 << 25):
+    """Exact cosine of each (a[i], b[i]) pair, as row-wise sparse dot products.
+
+    Pairs are grouped by their longer row; a block of those rows is
+    scattered into a reused dense buffer (at most `dense_budget` floats), and
+    each pair's shorter row reads its matches straight out of it, so a pair
+    costs O(nnz of its shorter row) and no pairwise submatrices are built.
+    """
+    matrix = matrix.tocsr()
+    n_cols = matrix.shape[1]
+    lengths = np.diff(matrix.indptr)
+    data = matrix.data.astype(np.float32)
+    inverse = inverse_norms(norms)
+
+    swap = lengths[a] > lengths[b]
+    short, long = np.where(swap, b, a), np.where(swap, a, b)
+    order = np.argsort(long, kind='stable')
+    long_rows, first = np.unique(long[order], return_index=True)
+    bounds = np.append(first, len(order))
+    block = max(1, min(dense_budget // max(n_cols, 1), len(long_rows)))
+    dense = np.zeros(block * n_cols, dtype=np.float32)
+    sims = np.empty(len(a), dtype=np.float32)
+    for i in range(0, len(long_rows), block):
+        block_rows = long_rows[i:i + block]
+        counts = lengths[block_rows]
+        entry = np.repeat(matrix.indptr[block_rows], counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = np.repeat(np.arange(len(block_rows)) * n_cols, counts) + matrix.indices[entry]
+        dense[cells] = data[entry]
+
+        pairs = order[bounds[i]:bounds[i + len(block_rows)]]
+        s = short[pairs]
+        counts = lengths[s]
+        entry = np.repeat(matrix.indptr[s], counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        base = np.searchsorted(block_rows, long[pairs]) * n_cols
+        products = dense[np.repeat(base, counts) + matrix.indices[entry]] * data[entry]
+        dots = np.bincount(np.repeat(np.arange(len(pairs)), counts), weights=products, minlength=len(pairs))
+        sims[pairs] = dots * inverse[s] * inverse[long[pairs]]
+        dense[cells] = 0
+    return sims
+
+
+def neighbor_table(n_rows, a, b, sims, k):
+    """Top-k per row from scored undirected pairs; missing slots are -1 / -inf."""
+    src = np.concatenate([a, b])
+    dst = np.concatenate([b, a])
+    both = np.concatenate([sims, sims])
+    order = np.lexsort((-both, src))
+    src, dst, both = src[order], dst[order], both[order]
+    first_of_row = np.searchsorted(src, src, side='left')
+    rank = np.arange(len(src)) - first_of_row
+    keep = rank < k
+
+    ids = np.full((n_rows, k), -1, dtype=np.int32)
+    table_sims = np.full((n_rows, k), -np.inf, dtype=np.float32)
+    ids[src[keep], rank[keep]] = dst[keep]
+    table_sims[src[keep], rank[keep]] = both[keep]
+    return ids, table_sims
+
+
+def recall_at_k(matrix, norms, ids, k, sample, seed=0):
+    """Share of the exact top-k (with similarity > 0) that the LSH table found."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(matrix.shape[0], size=min(sample, matrix.shape[0]), replace=False)
+    exact_ids, exact_sims = top_k_neighbors(matrix, norms, k, rows=rows)
+    found = total = 0
+    for row, exact, exact_sim in zip(rows, exact_ids, exact_sims):
+        relevant = set(exact[exact_sim > 0].tolist())
+        found += len(relevant & set(ids[row].tolist()))
+        total += len(relevant)
+    return found / total if total else 1.0
+
+
+def lsh_neighbors(matrix, norms, k, n_hashes=64, bands=64, max_candidates=None, seed=0):
+    """Approximate top-k cosine neighbor table built from LSH candidates only.
+
+    `max_candidates` (pairs scored per book) defaults to 2k.
+    """
+    check_bands(n_hashes, bands)
+    sigs = signatures(matrix, n_hashes, seed)
+    a, b = candidate_pairs(sigs, bands, np.diff(matrix.indptr), max_candidates=max_candidates or 2 * k)
+    sims = pair_cosines(matrix, norms, a, b)
+    ids, table_sims = neighbor_table(matrix.shape[0], a, b, sims, k)
+    return ids, table_sims, len(a)
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def file_digest(path):
+    """Content hash of an input file (what the first stages are keyed on)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_status_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) * 1024
+    return None
+
+
+def reset_peak_rss():
+    """Start a new peak-RSS window (Linux only; elsewhere peaks are cumulative)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """Peak resident memory in bytes since the last reset, or None if unknown."""
+    try:
+        return _read_status_kb('VmHWM')
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _mb(n_bytes):
+    return f"{n_bytes / 2**20:,.1f}" if n_bytes is not None else "n/a"
+
+
+def _save(obj, path):
+    if isinstance(obj, pd.DataFrame):
+        obj.to_pickle(path + '.df.pkl')
+    elif sparse.issparse(obj):
+        sparse.save_npz(path + '.npz', obj.tocsr(), compressed=False)
+    elif isinstance(obj, np.ndarray):
+        np.save(path + '.npy', obj)
+    else:
+        with open(path + '.pkl', 'wb') as f:
+            pickle.dump(obj, f)
+
+
+def _load(path):
+    if os.path.exists(path + '.df.pkl'):
+        return pd.read_pickle(path + '.df.pkl')
+    if os.path.exists(path + '.npz'):
+        return sparse.load_npz(path + '.npz').tocsr()
+    if os.path.exists(path + '.npy'):
+        return np.load(path + '.npy', allow_pickle=False)
+    with open(path + '.pkl', 'rb') as f:
+        return pickle.load(f)
+
+
+class _CachedOutputs(dict):
+    """Outputs of a reused stage, read from the cache only when first accessed.
+
+    If every stage downstream is reused too, nothing is ever loaded.
+    """
+
+    def __init__(self, stage_dir, names):
+        super().__init__()
+        self.stage_dir = stage_dir
+        self.names = names
+
+    def __missing__(self, name):
+        if name not in self.names:
+            raise KeyError(name)
+        value = self[name] = _load(os.path.join(self.stage_dir, name))
+        return value
+
+
+class StageResult:
+    """Named outputs of a stage plus the cache key they are stored under."""
+
+    def __init__(self, key, outputs):
+        self.key = key
+        self.outputs = outputs
+
+    def __getitem__(self, name):
+        return self.outputs[name]
+
+
+class Pipeline:
+    """Runs build stages, caching each stage's outputs under a hash of
+    (stage name, version, parameters, upstream keys).
+
+    A stage whose key is already in the cache is loaded instead of run, so
+    changing a parameter only recomputes that stage and what depends on it.
+    """
+
+    def __init__(self, cache_dir='.build_cache', use_cache=True):
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self.records = []
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def stage(self, name, fn, inputs=(), params=None, version=1, stats=None):
+        """Run (or reuse) `fn(*upstream outputs, **params)`, which returns a dict of outputs.
+
+        `inputs` are StageResults from earlier stages, or strings (e.g. file
+        digests) for the raw inputs at the start of the pipeline. `stats(outputs)`
+        returns a dict of figures for the build report; it is cached with the
+        outputs so reused stages still report them.
+        """
+        params = params or {}
+        upstream = [item.key if isinstance(item, StageResult) else item for item in inputs]
+        key_source = json.dumps([name, version, params, upstream], sort_keys=True, default=str)
+        key = hashlib.sha256(key_source.encode('utf-8')).hexdigest()[:20]
+        stage_dir = os.path.join(self.cache_dir, f"{name}-{key}")
+        done_marker = os.path.join(stage_dir, 'stage.json')
+
+        print(f"--- {len(self.records) + 1}. {name.upper().replace('_', ' ')} ---")
+        reset_peak_rss()
+        start = time.perf_counter()
+        if self.use_cache and os.path.exists(done_marker):
+            with open(done_marker) as f:
+                marker = json.load(f)
+            outputs = _CachedOutputs(stage_dir, marker['outputs'])
+            stage_stats = marker['stats']
+            status = 'reused'
+        else:
+            args = [item.outputs for item in inputs if isinstance(item, StageResult)]
+            outputs = fn(*args, **params)
+            stage_stats = stats(outputs) if stats else {}
+            if self.use_cache:
+                os.makedirs(stage_dir, exist_ok=True)
+                for out, obj in outputs.items():
+                    _save(obj, os.path.join(stage_dir, out))
+                # Written last: a stage interrupted mid-save is simply recomputed
+                with open(done_marker, 'w') as f:
+                    json.dump({"outputs": list(outputs), "stats": stage_stats}, f)
+            status = 'computed'
+
+        self._record(name, status, key, start, stage_stats)
+        return StageResult(key, outputs)
+
+    def step(self, name, fn, *args):
+        """An uncached step (e.g. writing the final artifacts), still timed."""
+        print(f"--- {len(self.records) + 1}. {name.upper().replace('_', ' ')} ---")
+        reset_peak_rss()
+        start = time.perf_counter()
+        result = fn(*args)
+        self._record(name, 'run', '-', start, {})
+        return result
+
+    def _record(self, name, status, key, start, stage_stats):
+        self.records.append({"stage": name, "status": status, "key": key,
+                             "seconds": time.perf_counter() - start,
+                             "peak_rss_bytes": peak_rss(), "stats": stage_stats})
+
+    def summary(self):
+        lines = [f"{'stage':<16} {'status':<9} {'seconds':>8} {'peak MB':>9}  stats"]
+        for record in self.records:
+            stats = ", ".join(f"{k}={v:,}" if isinstance(v, int) else f"{k}={v}"
+                              for k, v in record['stats'].items())
+            lines.append(f"{record['stage']:<16} {record['status']:<9} {record['seconds']:>8.2f} "
+                         f"{_mb(record['peak_rss_bytes']):>9}  {stats}")
+        total = sum(record['seconds'] for record in self.records)
+        reused = sum(record['status'] == 'reused' for record in self.records)
+        peaks = [record['peak_rss_bytes'] for record in self.records if record['peak_rss_bytes']]
+        lines.append(f"{'total':<16} {f'{reused} reused':<9} {total:>8.2f} {_mb(max(peaks) if peaks else None):>9}")
+        return "\n".join(lines)
+
+    def report(self, artifact_paths, path='build_report.json'):
+        """Write the per-stage timings/memory/stats plus artifact sizes as JSON."""
+        sizes = {p: os.path.getsize(p) for p in artifact_paths if os.path.exists(p)}
+        report = {
+            "generated_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "total_seconds": sum(record['seconds'] for record in self.records),
+            "stages": self.records,
+            "artifacts": {"files": sizes, "total_bytes": sum(sizes.values())},
+        }
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        lines = [f"{'artifact':<28} {'MB':>9}"]
+        lines += [f"{p:<28} {_mb(size):>9}" for p, size in sizes.items()]
+        lines.append(f"{'total':<28} {_mb(report['artifacts']['total_bytes']):>9}")
+        return "\n".join(lines)
@@ -0,0 +1,140 @@
+"""Taste profiles that are kept up to date one book at a time.
+
+A profile is the sum of the L2-normalized matrix rows of the books in it
+(a vector over users), so adding or removing a book touches only that
+book's non-zeros. Scoring every book against it is one sparse mat-vec,
+which the owner caches until the profile changes again. Given the matrix
+by user as well, the profile instead keeps its scores current on every
+change (touching only the co-readers of the changed book), so `top` is a
+partial sort and nothing else, and the vector itself is never stored.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from similarity import inverse_norms
+
+
+class TasteProfile:
+    def __init__(self, matrix, norms, by_user=None):
+        self.matrix = matrix
+        self.by_user = by_user
+        self.inverse = inverse_norms(norms)
+        # Kept current either way, so only one of the two is allocated
+        self.vector = np.zeros(matrix.shape[1], dtype=np.float32) if by_user is None else None
+        self.dots = np.zeros(matrix.shape[0], dtype=np.float32) if by_user is not None else None
+        self.weights = {}   # matrix row -> weight it was added with
+        self.version = 0    # bumped on every change; caches compare against it
+
+    def add(self, row, weight=1.0):
+        """Add a book (replacing its previous weight, if any). O(nnz of the row)."""
+        if row in self.weights:
+            self.remove(row)
+        self._apply(row, weight)
+        self.weights[row] = weight
+
+    def remove(self, row):
+        weight = self.weights.pop(row, None)
+        if weight is not None:
+            self._apply(row, -weight)
+
+    def _apply(self, row, weight):
+        start, stop = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        users = self.matrix.indices[start:stop]
+        delta = weight * self.inverse[row] * self.matrix.data[start:stop].astype(np.float32)
+        if self.dots is None:
+            self.vector[users] += delta
+        else:
+            # Only books read by these users change score
+            self.dots += self.by_user[users].T @ delta
+        self.version += 1
+
+    def copy(self):
+        """Snapshot sharing the matrix, to score outside the owner's lock while it keeps changing."""
+        snapshot = copy.copy(self)
+        snapshot.vector = None if self.vector is None else self.vector.copy()
+        snapshot.dots = None if self.dots is None else self.dots.copy()
+        snapshot.weights = dict(self.weights)
+        return snapshot
+
+    def scores(self):
+        """Cosine similarity (up to the profile's own norm) of every row to the profile."""
+        dots = self.matrix @ self.vector if self.dots is None else self.dots.copy()
+        return dots * self.inverse
+
+    def top(self, n):
+        """The n best-scoring rows not already in the profile, best first."""
+        if not self.weights or n <= 0:
+            return np.empty(0, dtype=np.int64)
+        scores = self.scores()
+        scores[np.fromiter(self.weights, dtype=np.int64)] = -np.inf
+        n = min(n, len(scores))
+        best = np.argpartition(-scores, n - 1)[:n]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return best[np.isfinite(scores[best]) & (scores[best] > 0)]
+
+
+class ProfileCache:
+    """Bounded map of live profiles; the least recently used is dropped first.
+
+    With a `ttl` (seconds), entries unused for that long are dropped too.
+    Owners that can rebuild a dropped profile from their own storage pass
+    `build` to `get`; for the others (sessions) eviction is expiry.
+    `lock` serializes changes to the cached profiles; hold it around `get`
+    when a build must not race with such changes.
+    """
+
+    def __init__(self, max_entries, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()   # key -> [value, last used], least recent first
+        self.lock = threading.RLock()
+
+    def _evict(self, now):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        while self.ttl is not None and self.entries:
+            oldest = next(iter(self.entries.values()))
+            if now - oldest[1] <= self.ttl:
+                break
+            self.entries.popitem(last=False)
+
+    def get(self, key, build=None):
+        """The entry for `key` (marked as just used); built if missing, else None.
+
+        `build` runs outside the lock (unless the caller holds it), so a slow
+        build doesn't stall every other request. If two requests build the
+        same key, the first one stored wins and both return it.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._evict(now)
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.entries[key][1] = now
+                return self.entries[key][0]
+        if build is None:
+            return None
+        value = build()
+        with self.lock:
+            if key in self.entries:
+                return self.entries[key][0]
+            return self.put(key, value)
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = [value, time.monotonic()]
+            self.entries.move_to_end(key)
+            self._evict(time.monotonic())
+            return value
+
+    def pop(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            return None if entry is None else entry[0]
+
+    def __len__(self):
+        return len(self.entries)
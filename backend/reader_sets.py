@@ -0,0 +1,71 @@
+"""Implicit-feedback engine: each book's reader set, stored sparse.
+
+A reader set is the users who read a book (rated it, or shelved it as
+to-read), kept as the indptr/indices of a 0/1 books x users matrix with no
+data array, both by book and by user. The readers a book shares with every
+other book are counted by concatenating its readers' book lists and
+bincounting them. A query therefore costs the book's co-read volume, like a
+sparse cosine row, instead of a scan over every book. At ~1% density this
+also takes 8 bytes per read (4 per direction) where packed bitsets would
+take n_users / 8 bytes per book, almost all of them zero words.
+"""
+import numpy as np
+from scipy.sparse import csr_matrix
+
+METRICS = ('jaccard', 'overlap')
+
+
+def reader_sets(matrix, rows=(), cols=()):
+    """(indptr, indices) of the non-zero pattern of `matrix`, plus extra (row, col) reads."""
+    rows, cols = np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+    extra = csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=matrix.shape)
+    pattern = (matrix.astype(bool).astype(np.int8) + extra).tocsr()
+    pattern.sum_duplicates()
+    pattern.sort_indices()
+    return pattern.indptr.astype(np.int64), pattern.indices.astype(np.int32)
+
+
+def _concat_rows(indptr, indices, rows):
+    """indices of `rows`, concatenated (a row gather without building a sparse matrix)."""
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    shift = np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+    return indices[np.arange(len(shift)) - shift]
+
+
+class ReaderSets:
+    """Reader sets by book and by user, loaded once at server start."""
+
+    def __init__(self, indptr, indices, n_users):
+        self.indptr, self.indices = indptr, indices
+        self.counts = np.diff(indptr)
+        self.n_books = len(indptr) - 1
+        # Same pattern by user: sort the reads by user, books stay sorted within each user
+        order = np.argsort(indices, kind='stable')
+        self.user_indices = np.repeat(np.arange(self.n_books, dtype=np.int32), self.counts)[order]
+        self.user_indptr = np.zeros(n_users + 1, dtype=np.int64)
+        np.cumsum(np.bincount(indices, minlength=n_users), out=self.user_indptr[1:])
+
+    def similarity_scores(self, row, metric='jaccard'):
+        """Similarity of book `row` to every book, as float32.
+
+        jaccard = |A & B| / |A | B|, overlap = |A & B| / min(|A|, |B|).
+        """
+        readers = self.indices[self.indptr[row]:self.indptr[row + 1]]
+        shared = np.bincount(_concat_rows(self.user_indptr, self.user_indices, readers), minlength=self.n_books)
+        if metric == 'jaccard':
+            denom = self.counts + self.counts[row] - shared
+        else:
+            denom = np.minimum(self.counts, self.counts[row])
+        scores = np.zeros(self.n_books, dtype=np.float32)
+        np.divide(shared, denom, out=scores, where=denom > 0, casting='unsafe')
+        return scores
+
+    def top_neighbors(self, row, n, metric='jaccard'):
+        """The n most similar books to `row` (excluding itself) and their scores, best first."""
+        scores = self.similarity_scores(row, metric)
+        scores[row] = -np.inf
+        n = min(n, len(scores) - 1)
+        best = np.argpartition(-scores, n - 1)[:n]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return best, scores[best]
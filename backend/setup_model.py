@@ -1,66 +1,379 @@
+import argparse
+import os
+from functools import partial
 import pandas as pd
 import numpy as np
 import pickle
-from sklearn.neighbors import NearestNeighbors
 from scipy.sparse import csr_matrix
+from build_profiles import PROFILES, parse_size, plan, storage_dtype
+from als import train_als
+from authors import author_matrix
+from artifacts import ARTIFACT_FILES, MANIFEST, OPTIONAL_ARTIFACT_FILES, write_manifest
+from clusters import book_clusters
+from content import content_matrix
+from fragments import catalog_fragments, write_fragment_blob
+from minhash import band_threshold, check_bands, lsh_neighbors, recall_at_k
+from pipeline import Pipeline, file_digest
+from reader_sets import reader_sets
+from similarity import row_norms, top_k_neighbors
 
-print("--- 1. LOADING DATA ---")
-books = pd.read_csv('data/books.csv', on_bad_lines='skip')
-ratings = pd.read_csv('data/ratings.csv')
-
-print("--- 2. CLEANING DATA ---")
-# Select columns (Including average_rating for the stars)
-books = books[['book_id', 'original_title', 'title', 'isbn', 'authors', 'image_url', 'average_rating']]
-books['original_title'] = books['original_title'].fillna(books['title'])
-books.drop(columns=['title'], inplace=True)
-books.rename(columns={'original_title': 'title', 'image_url': 'img_url'}, inplace=True)
-books.dropna(subset=['title', 'isbn'], inplace=True)
-
-# Filter Users (Keep "Real" Readers)
-user_counts = ratings['user_id'].value_counts()
-active_users = user_counts[user_counts >= 10].index 
-ratings = ratings[ratings['user_id'].isin(active_users)]
-
-# Filter Books (Remove obscure ones to save RAM)
-book_counts = ratings['book_id'].value_counts()
-popular_books = book_counts[book_counts >= 10].index
-ratings = ratings[ratings['book_id'].isin(popular_books)]
-
-# Merge
-ratings_with_books = ratings.merge(books, on='book_id')
-ratings_with_books.drop_duplicates(['user_id', 'title'], inplace=True)
-
-print("--- 3. COMPRESSING DATA ---")
-# Create the Pivot Table (The Heavy Step)
-book_pivot = ratings_with_books.pivot_table(columns='user_id', index='title', values='rating')
-book_pivot.fillna(0, inplace=True)
-
-# THE OPTIMIZATION: Convert to Sparse Matrix immediately
-book_sparse = csr_matrix(book_pivot)
-book_names = book_pivot.index.tolist() # Just save the list of names
-
-print(f"Matrix Shape: {book_pivot.shape}")
-print("Data compressed successfully.")
-
-print("--- 4. TRAINING MODEL ---")
-model = NearestNeighbors(algorithm='brute', metric='cosine')
-model.fit(book_sparse)
-
-print("--- 5. SAVING LIGHTWEIGHT ARTIFACTS ---")
-# 1. Save the Compressed Matrix (Tiny)
-with open('book_sparse.pkl', 'wb') as f:
-    pickle.dump(book_sparse, f)
-
-# 2. Save just the Names (Tiny)
-with open('book_names.pkl', 'wb') as f:
-    pickle.dump(book_names, f)
-
-# 3. Save the Model
-with open('model.pkl', 'wb') as f:
-    pickle.dump(model, f)
-
-# 4. Save Metadata (for images/ISBNs)
-with open('books_metadata.pkl', 'wb') as f:
-    pickle.dump(books, f)
-
-print("SUCCESS! Optimized files saved.")
\ No newline at end of file
+# Each stage below returns a dict of named outputs; the Pipeline caches them
+# under a hash of the stage's inputs + parameters, so re-running with a new
+# threshold only recomputes from the stage that threshold feeds into.
+
+# --- Figures for the build report (rows/cols left after each step) ---
+
+def frame_stats(name):
+    return lambda outputs: {"rows": len(outputs[name])}
+
+def ratings_stats(outputs):
+    ratings = outputs['ratings'] if 'ratings' in outputs else outputs['frame']
+    return {"ratings": len(ratings), "users": int(ratings['user_id'].nunique()),
+            "books": int(ratings['book_id'].nunique())}
+
+def matrix_stats(outputs):
+    book_sparse = outputs['book_sparse']
+    n_rows, n_cols = book_sparse.shape
+    return {"books": n_rows, "users": n_cols, "nnz": int(book_sparse.nnz), "dtype": str(book_sparse.dtype),
+            "density": round(book_sparse.nnz / max(n_rows * n_cols, 1), 6)}
+
+def load_csv(path, **read_options):
+    return lambda: {"frame": pd.read_csv(path, **read_options)}
+
+def clean_books(raw):
+    # Select columns (Including average_rating for the stars)
+    books = raw['frame'][['book_id', 'original_title', 'title', 'isbn', 'authors', 'image_url', 'average_rating']].copy()
+    books['original_title'] = books['original_title'].fillna(books['title'])
+    books.drop(columns=['title'], inplace=True)
+    books.rename(columns={'original_title': 'title', 'image_url': 'img_url'}, inplace=True)
+    books.dropna(subset=['title', 'isbn'], inplace=True)
+    return {"books": books}
+
+def filter_users(raw, min_ratings):
+    # Filter Users (Keep "Real" Readers)
+    ratings = raw['frame']
+    user_counts = ratings['user_id'].value_counts()
+    active_users = user_counts[user_counts >= min_ratings].index
+    return {"ratings": ratings[ratings['user_id'].isin(active_users)]}
+
+def filter_books(users, min_ratings):
+    # Filter Books (Remove obscure ones to save RAM)
+    ratings = users['ratings']
+    book_counts = ratings['book_id'].value_counts()
+    popular_books = book_counts[book_counts >= min_ratings].index
+    return {"ratings": ratings[ratings['book_id'].isin(popular_books)]}
+
+def merge(filtered, cleaned):
+    ratings_with_books = filtered['ratings'].merge(cleaned['books'], on='book_id')
+    ratings_with_books.drop_duplicates(['user_id', 'title'], inplace=True)
+    return {"ratings_with_books": ratings_with_books}
+
+def plan_build(raw, cleaned, budget, k, engines):
+    n_catalog = cleaned['books']['title'].nunique()
+    return {"plan": plan(raw['frame'], budget, k, engines, n_catalog)}
+
+def plan_stats(outputs):
+    build_plan = outputs['plan']
+    return {"min_user_ratings": build_plan['min_user_ratings'], "min_book_ratings": build_plan['min_book_ratings'],
+            "estimated_mb": round(build_plan['estimated_bytes'] / 2**20, 1),
+            "books_kept": f"{build_plan['coverage']['books']:.1%}", "users_kept": f"{build_plan['coverage']['users']:.1%}"}
+
+def pivot(merged):
+    ratings_with_books = merged['ratings_with_books']
+
+    # THE OPTIMIZATION: Build the Sparse Matrix straight from the (title, user)
+    # pairs, never materializing the dense pivot table. Rows/columns come out
+    # sorted exactly like pivot_table's index/columns.
+    rows, titles = pd.factorize(ratings_with_books['title'], sort=True)
+    cols, users = pd.factorize(ratings_with_books['user_id'], sort=True)
+    dtype = storage_dtype(ratings_with_books['rating'])
+    book_sparse = csr_matrix((ratings_with_books['rating'].to_numpy(dtype=dtype), (rows, cols)),
+                             shape=(len(titles), len(users)))
+    book_sparse.eliminate_zeros()
+    book_sparse.sort_indices()
+
+    # Compact storage: 1-byte ratings, int32 indices (indptr too while nnz allows)
+    book_sparse.indices = book_sparse.indices.astype(np.int32)
+    book_sparse.indptr = book_sparse.indptr.astype(np.int32 if book_sparse.nnz < 2**31 else np.int64)
+
+    book_names = titles.tolist() # Just save the list of names
+    user_ids = users.to_numpy(dtype=np.int64) # Column -> user_id
+
+    print(f"Matrix Shape: {book_sparse.shape}, {book_sparse.dtype} ratings")
+    return {"book_sparse": book_sparse, "book_names": book_names, "user_ids": user_ids}
+
+def neighbors(pivoted, k):
+    # Brute-force cosine over every pair, done once here so serving is a table lookup
+    book_sparse = pivoted['book_sparse']
+    norms = row_norms(book_sparse)
+    neighbor_ids, neighbor_sims = top_k_neighbors(book_sparse, norms, k)
+    return {"norms": norms, "neighbor_ids": neighbor_ids, "neighbor_sims": neighbor_sims}
+
+def lsh_neighbors_stage(pivoted, k, n_hashes, bands, max_candidates, recall_sample):
+    # Sub-quadratic: only pairs that collide in a MinHash band get scored, at most max_candidates per book
+    book_sparse = pivoted['book_sparse']
+    norms = row_norms(book_sparse)
+    neighbor_ids, neighbor_sims, n_pairs = lsh_neighbors(book_sparse, norms, k, n_hashes, bands, max_candidates)
+    recall = recall_at_k(book_sparse, norms, neighbor_ids, k, recall_sample) if recall_sample else None
+    print(f"{n_pairs:,} candidate pairs scored"
+          + (f", recall@{k} vs exact on {recall_sample} books: {recall:.3f}" if recall is not None else ""))
+    return {"norms": norms, "neighbor_ids": neighbor_ids, "neighbor_sims": neighbor_sims,
+            "lsh": {"threshold": band_threshold(n_hashes, bands), "candidate_pairs": n_pairs, "recall": recall}}
+
+def neighbor_stats(outputs):
+    stats = {"k": int(outputs['neighbor_ids'].shape[1])}
+    if 'lsh' in outputs:
+        stats.update(outputs['lsh'])
+        stats["unfilled_slots"] = int((outputs['neighbor_ids'] < 0).sum())
+    return stats
+
+def build_reader_sets(pivoted, cleaned, to_read_path=None):
+    # Reader sets for the implicit-feedback engine: rated, plus shelved as to-read
+    rows, cols = [], []
+    if to_read_path:
+        shelved = pd.read_csv(to_read_path).merge(cleaned['books'][['book_id', 'title']], on='book_id')
+        row_of = {title: i for i, title in enumerate(pivoted['book_names'])}
+        rows = shelved['title'].map(row_of)
+        cols = pd.Index(pivoted['user_ids']).get_indexer(shelved['user_id'])
+        keep = rows.notna().to_numpy() & (cols >= 0)
+        rows, cols = rows[keep].to_numpy(dtype=np.int64), cols[keep]
+    indptr, indices = reader_sets(pivoted['book_sparse'], rows, cols)
+    return {"indptr": indptr, "indices": indices}
+
+def build_content(raw, cleaned, k, book_tags_path=None, tags_path=None):
+    # Content neighbors for every catalog entry (same rows as the fragment blob)
+    catalog = cleaned['books'].drop_duplicates('title')
+    goodreads_ids = catalog['book_id'].map(
+        raw['frame'].drop_duplicates('book_id').set_index('book_id')['goodreads_book_id'])
+    book_tags = pd.read_csv(book_tags_path) if book_tags_path else None
+    tags = pd.read_csv(tags_path) if tags_path else None
+    matrix = content_matrix(catalog, goodreads_ids, book_tags, tags)
+    content_ids, content_sims = top_k_neighbors(matrix, row_norms(matrix), k)
+    return {"content_ids": content_ids, "content_sims": content_sims}
+
+def build_clusters(raw, cleaned, pivoted, neighbored, threshold):
+    # Series/edition cluster per catalog id (same rows as the fragment blob)
+    catalog = cleaned['books'].drop_duplicates('title')
+    full_titles = catalog['book_id'].map(raw['frame'].drop_duplicates('book_id').set_index('book_id')['title'])
+    catalog_index = {title: i for i, title in enumerate(catalog['title'].tolist())}
+    cf_catalog_ids = np.array([catalog_index.get(title, -1) for title in pivoted['book_names']], dtype=np.int64)
+    # Neighbor pairs similar enough to be the same work (padding has -inf similarity)
+    rows, cols = np.nonzero(neighbored['neighbor_sims'] >= threshold)
+    a, b = cf_catalog_ids[rows], cf_catalog_ids[neighbored['neighbor_ids'][rows, cols]]
+    keep = (a >= 0) & (b >= 0)
+    clusters = book_clusters(catalog['authors'].fillna('').tolist(), catalog['title'].tolist(),
+                             full_titles.fillna('').tolist(), (a[keep], b[keep]))
+    return {"clusters": clusters}
+
+def build_authors(cleaned, pivoted, k):
+    # Author vectors (sum of their books' normalized rows) and each author's top-k similar authors
+    catalog = cleaned['books'].drop_duplicates('title').set_index('title')
+    first_authors = catalog['authors'].fillna('').astype(str).str.split(',').str[0].str.strip()
+    book_sparse = pivoted['book_sparse']
+    matrix, names = author_matrix(book_sparse, row_norms(book_sparse), first_authors.reindex(pivoted['book_names']))
+    author_ids, author_sims = top_k_neighbors(matrix, row_norms(matrix), k)
+    return {"names": np.array(names, dtype=str), "author_ids": author_ids, "author_sims": author_sims}
+
+def build_als(pivoted, factors, reg, alpha, iterations, implicit):
+    # User x book factorization for profile recommendations (fold-in at serve time)
+    item_factors, user_factors = train_als(pivoted['book_sparse'], factors, reg, alpha, iterations, implicit)
+    # Fold-in must use the training objective: [reg, alpha, implicit]
+    params = np.array([reg, alpha, float(implicit)], dtype=np.float64)
+    return {"item_factors": item_factors, "user_factors": user_factors, "params": params}
+
+def save_artifacts(pivoted, neighbored, cleaned, build_key, extra_arrays):
+    write_artifacts(pivoted['book_sparse'], pivoted['book_names'], pivoted['user_ids'], cleaned['books'],
+                    neighbored['norms'], neighbored['neighbor_ids'], neighbored['neighbor_sims'], build_key,
+                    extra_arrays)
+
+def write_artifacts(book_sparse, book_names, user_ids, books, norms, neighbor_ids, neighbor_sims, build_key,
+                    extra_arrays=None):
+    """Write everything the server loads (also used by update_model.py).
+
+    `extra_arrays` maps optional engine files (OPTIONAL_ARTIFACT_FILES) to
+    arrays; optional files left over from an earlier build are removed so
+    the server never pairs them with a matrix they were not built from.
+    """
+    # 1. Save the Compressed Matrix (Tiny)
+    with open('book_sparse.pkl', 'wb') as f:
+        pickle.dump(book_sparse, f)
+
+    # 2. Save just the Names (Tiny)
+    with open('book_names.pkl', 'wb') as f:
+        pickle.dump(book_names, f)
+
+    # 3. Save the Neighbor Table (replaces the kNN model: lookups, not searches)
+    np.save('book_norms.npy', norms)
+    np.save('book_neighbors.npy', neighbor_ids)
+    np.save('book_neighbor_sims.npy', neighbor_sims)
+    np.save('user_ids.npy', user_ids)
+
+    # 4. Save Metadata (for images/ISBNs)
+    with open('books_metadata.pkl', 'wb') as f:
+        pickle.dump(books, f)
+
+    # 5. Save pre-serialized API responses per book (sliced straight out of an mmap by the server)
+    catalog = books.drop_duplicates('title')
+    catalog_index = {title: i for i, title in enumerate(catalog['title'].tolist())}
+    write_fragment_blob('book_fragments.bin', catalog_fragments(catalog))
+    np.save('cf_catalog_ids.npy', np.array([catalog_index.get(title, -1) for title in book_names], dtype=np.int32))
+
+    # 6. Save optional engine data
+    extra_arrays = extra_arrays or {}
+    for path in OPTIONAL_ARTIFACT_FILES:
+        if path in extra_arrays:
+            np.save(path, extra_arrays[path])
+        elif os.path.exists(path):
+            os.remove(path)
+
+    # 7. Stamp the build with a content version (drives HTTP ETags)
+    manifest = write_manifest(build_key=build_key)
+    print(f"Artifact version: {manifest['version']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the recommendation artifacts from books.csv/ratings.csv")
+    parser.add_argument('--data-dir', default='data', help="directory holding books.csv and ratings.csv")
+    parser.add_argument('--min-user-ratings', type=int, default=10, help="drop users with fewer ratings")
+    parser.add_argument('--min-book-ratings', type=int, default=10, help="drop books with fewer ratings")
+    parser.add_argument('--profile', choices=list(PROFILES),
+                        help="derive thresholds from a preset memory budget")
+    parser.add_argument('--memory-budget', help="derive thresholds from this budget, e.g. 2GB")
+    parser.add_argument('--neighbors', type=int, default=200,
+                        help="neighbors precomputed per book (how deep recommendation pages go)")
+    parser.add_argument('--neighbors-method', choices=['exact', 'lsh'], default='exact',
+                        help="exact all-pairs cosine, or MinHash LSH candidates (sub-quadratic, approximate)")
+    parser.add_argument('--lsh-hashes', type=int, default=64, help="MinHash signature length")
+    parser.add_argument('--lsh-bands', type=int, default=64,
+                        help="LSH bands (must divide --lsh-hashes); the Jaccard threshold is (1/bands)^(bands/hashes)")
+    parser.add_argument('--lsh-candidates', type=int, default=0,
+                        help="most candidate pairs scored per book (0: twice --neighbors)")
+    parser.add_argument('--lsh-recall-sample', type=int, default=200,
+                        help="books checked against exact search to report recall (0 to skip)")
+    parser.add_argument('--reader-sets', '--bitsets', dest='reader_sets', action='store_true',
+                        help="also build the reader-set (Jaccard/overlap) engine")
+    parser.add_argument('--to-read', help="to_read.csv (user_id,book_id) whose shelves count as reads for --reader-sets")
+    parser.add_argument('--content', action='store_true',
+                        help="also build the content (TF-IDF) engine; uses book_tags.csv/tags.csv if present")
+    parser.add_argument('--clusters', action='store_true',
+                        help="also cluster series/editions so results show one book per cluster")
+    parser.add_argument('--cluster-threshold', type=float, default=0.5,
+                        help="collaborative similarity above which same-author books are one cluster")
+    parser.add_argument('--authors', action='store_true', help="also build the similar-authors index")
+    parser.add_argument('--author-neighbors', type=int, default=50, help="similar authors precomputed per author")
+    parser.add_argument('--als', action='store_true', help="also train the ALS matrix factorization engine")
+    parser.add_argument('--als-factors', type=int, default=64, help="latent factors per user/book")
+    parser.add_argument('--als-reg', type=float, default=1.0, help="L2 regularization")
+    parser.add_argument('--als-alpha', type=float, default=5.0, help="implicit confidence per rating star")
+    parser.add_argument('--als-iterations', type=int, default=15)
+    parser.add_argument('--als-explicit', action='store_true',
+                        help="fit star ratings on observed entries instead of implicit confidence")
+    parser.add_argument('--cache-dir', default='.build_cache', help="where stage outputs are cached")
+    parser.add_argument('--no-cache', action='store_true', help="recompute every stage")
+    args = parser.parse_args()
+    if args.neighbors_method == 'lsh':
+        try:
+            check_bands(args.lsh_hashes, args.lsh_bands)
+        except ValueError as e:
+            parser.error(str(e))
+
+    books_csv = os.path.join(args.data_dir, 'books.csv')
+    ratings_csv = os.path.join(args.data_dir, 'ratings.csv')
+    pipeline = Pipeline(args.cache_dir, use_cache=not args.no_cache)
+
+    raw_books = pipeline.stage('load_books', load_csv(books_csv, on_bad_lines='skip'), inputs=[file_digest(books_csv)],
+                               stats=frame_stats('frame'))
+    raw_ratings = pipeline.stage('load_ratings', load_csv(ratings_csv), inputs=[file_digest(ratings_csv)],
+                                 stats=ratings_stats)
+    cleaned = pipeline.stage('clean_books', clean_books, inputs=[raw_books], stats=frame_stats('books'))
+
+    # Thresholds: planned from a memory budget, or taken as given
+    budget = parse_size(args.memory_budget) if args.memory_budget else PROFILES.get(args.profile)
+    if budget:
+        engines = {"reader_sets": args.reader_sets, "content_k": args.neighbors if args.content else 0,
+                   "clusters": args.clusters, "author_k": args.author_neighbors if args.authors else 0,
+                   "als_factors": args.als_factors if args.als else 0}
+        planned = pipeline.stage('plan', plan_build, inputs=[raw_ratings, cleaned], version=2,
+                                 params={"budget": budget, "k": args.neighbors, "engines": engines},
+                                 stats=plan_stats)
+        build_plan = planned['plan']
+        print(f"Budget {budget / 2**20:,.0f} MB -> thresholds {build_plan['min_user_ratings']}/"
+              f"{build_plan['min_book_ratings']}, ~{build_plan['estimated_bytes'] / 2**20:,.0f} MB; "
+              f"dropping {build_plan['dropped']['books']:,} books, {build_plan['dropped']['users']:,} users, "
+              f"{build_plan['dropped']['ratings']:,} ratings")
+    else:
+        build_plan = {"min_user_ratings": args.min_user_ratings, "min_book_ratings": args.min_book_ratings}
+
+    users = pipeline.stage('filter_users', filter_users, inputs=[raw_ratings],
+                           params={"min_ratings": build_plan['min_user_ratings']}, stats=ratings_stats)
+    filtered = pipeline.stage('filter_books', filter_books, inputs=[users],
+                              params={"min_ratings": build_plan['min_book_ratings']}, stats=ratings_stats)
+    merged = pipeline.stage('merge', merge, inputs=[filtered, cleaned], stats=frame_stats('ratings_with_books'))
+    pivoted = pipeline.stage('pivot', pivot, inputs=[merged], version=3, stats=matrix_stats)
+    if args.neighbors_method == 'lsh':
+        neighbored = pipeline.stage('neighbors_lsh', lsh_neighbors_stage, inputs=[pivoted], version=2,
+                                    params={"k": args.neighbors, "n_hashes": args.lsh_hashes, "bands": args.lsh_bands,
+                                            "max_candidates": args.lsh_candidates or 2 * args.neighbors,
+                                            "recall_sample": args.lsh_recall_sample},
+                                    stats=neighbor_stats)
+    else:
+        neighbored = pipeline.stage('neighbors', neighbors, inputs=[pivoted], params={"k": args.neighbors},
+                                    stats=neighbor_stats)
+
+    # Optional engines: each adds arrays to the artifact set and its key to the version
+    extra_arrays, build_keys = {}, [neighbored.key, cleaned.key]
+    if args.reader_sets:
+        inputs = [pivoted, cleaned] + ([file_digest(args.to_read)] if args.to_read else [])
+        readers = pipeline.stage('reader_sets', partial(build_reader_sets, to_read_path=args.to_read), inputs=inputs,
+                                 stats=lambda outputs: {"reads": len(outputs['indices'])})
+        extra_arrays.update({'book_readers_indptr.npy': readers['indptr'], 'book_readers.npy': readers['indices']})
+        build_keys.append(readers.key)
+
+    if args.content:
+        tag_files = [os.path.join(args.data_dir, name) for name in ('book_tags.csv', 'tags.csv')]
+        has_tags = all(os.path.exists(path) for path in tag_files)
+        inputs = [raw_books, cleaned] + ([file_digest(path) for path in tag_files] if has_tags else [])
+        tag_paths = dict(zip(['book_tags_path', 'tags_path'], tag_files)) if has_tags else {}
+        contented = pipeline.stage('content', partial(build_content, **tag_paths), inputs=inputs,
+                                   params={"k": args.neighbors},
+                                   stats=lambda outputs: {"books": int(outputs['content_ids'].shape[0]),
+                                                          "tags": has_tags})
+        extra_arrays.update({'content_neighbors.npy': contented['content_ids'],
+                             'content_neighbor_sims.npy': contented['content_sims']})
+        build_keys.append(contented.key)
+
+    if args.clusters:
+        clustered = pipeline.stage('clusters', build_clusters, inputs=[raw_books, cleaned, pivoted, neighbored],
+                                   params={"threshold": args.cluster_threshold},
+                                   stats=lambda outputs: {"books": len(outputs['clusters']),
+                                                          "clusters": int(len(np.unique(outputs['clusters'])))})
+        extra_arrays['book_clusters.npy'] = clustered['clusters']
+        build_keys.append(clustered.key)
+
+    if args.authors:
+        authored = pipeline.stage('authors', build_authors, inputs=[cleaned, pivoted],
+                                  params={"k": args.author_neighbors},
+                                  stats=lambda outputs: {"authors": len(outputs['names'])})
+        extra_arrays.update({'author_names.npy': authored['names'], 'author_neighbors.npy': authored['author_ids'],
+                             'author_neighbor_sims.npy': authored['author_sims']})
+        build_keys.append(authored.key)
+
+    if args.als:
+        factored = pipeline.stage('als', build_als, inputs=[pivoted],
+                                  params={"factors": args.als_factors, "reg": args.als_reg, "alpha": args.als_alpha,
+                                          "iterations": args.als_iterations, "implicit": not args.als_explicit},
+                                  stats=lambda outputs: {"factors": int(outputs['item_factors'].shape[1])})
+        extra_arrays.update({'als_item_factors.npy': factored['item_factors'],
+                             'als_user_factors.npy': factored['user_factors'],
+                             'als_params.npy': factored['params']})
+        build_keys.append(factored.key)
+
+    pipeline.step('save_artifacts', save_artifacts, pivoted.outputs, neighbored.outputs, cleaned.outputs,
+                  ":".join(build_keys), extra_arrays)
+
+    print(pipeline.summary())
+    print(pipeline.report(ARTIFACT_FILES + OPTIONAL_ARTIFACT_FILES + [MANIFEST]))
+    print("Build report written to build_report.json")
+    print("SUCCESS! Optimized files saved.")
+
+if __name__ == '__main__':
+    main()
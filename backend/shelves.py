@@ -0,0 +1,48 @@
+"""Server-side bookshelves in a local SQLite file.
+
+Shelves are keyed by an id the client picks (e.g. a UUID kept in
+localStorage) and hold the dataset's book_id, which stays stable across
+rebuilds, unlike matrix rows or catalog ids.
+"""
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shelf_books (
+    shelf_id TEXT NOT NULL,
+    book_id INTEGER NOT NULL,
+    added_at REAL NOT NULL,
+    PRIMARY KEY (shelf_id, book_id)
+)
+"""
+
+
+class ShelfStore:
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(SCHEMA)
+        self.connection.commit()
+        self.lock = threading.Lock()
+
+    def books(self, shelf_id):
+        """book_ids on the shelf, oldest first."""
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT book_id FROM shelf_books WHERE shelf_id = ? ORDER BY added_at', (shelf_id,)).fetchall()
+        return [book_id for (book_id,) in rows]
+
+    def add(self, shelf_id, book_id):
+        """True if the book was not on the shelf yet."""
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                'INSERT OR IGNORE INTO shelf_books VALUES (?, ?, ?)', (shelf_id, book_id, time.time()))
+        return cursor.rowcount == 1
+
+    def remove(self, shelf_id, book_id):
+        """True if the book was on the shelf."""
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                'DELETE FROM shelf_books WHERE shelf_id = ? AND book_id = ?', (shelf_id, book_id))
+        return cursor.rowcount == 1
@@ -0,0 +1,78 @@
+import numpy as np
+
+
+def as_float(matrix):
+    """The matrix with float32 data, for arithmetic on the compact (int8) rating matrix.
+
+    Products of int8 ratings would overflow in int8. Float matrices are
+    returned as they are; anything else is a copy with float32 data (4 bytes
+    per stored rating, plus indices), so pass row slices where possible.
+    """
+    return matrix if matrix.dtype.kind == 'f' else matrix.astype(np.float32)
+
+
+def transposed(matrix):
+    """Float32 CSR transpose, built once and reused across score blocks.
+
+    A full copy of the matrix: 8 bytes per stored rating (float32 data and
+    int32 indices), on top of the int8 original.
+    """
+    return as_float(matrix).T.tocsr()
+
+
+def row_norms(matrix):
+    """L2 norm of every row of a sparse matrix, as float32."""
+    row_of_entry = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    values = matrix.data.astype(np.float64)
+    squared = np.bincount(row_of_entry, weights=values * values, minlength=matrix.shape[0])
+    return np.sqrt(squared).astype(np.float32)
+
+
+def cosine_scores(matrix, norms, rows, matrix_t=None):
+    """Dense (len(rows), n_rows) cosine similarities of `rows` against every row.
+
+    Pass `matrix_t=transposed(matrix)` when scoring many blocks.
+    """
+    matrix_t = transposed(matrix) if matrix_t is None else matrix_t
+    dots = np.asarray((as_float(matrix[rows]) @ matrix_t).todense(), dtype=np.float32)
+    inverse = inverse_norms(norms)
+    dots *= inverse[rows][:, None]
+    dots *= inverse[None, :]
+    return dots
+
+
+def inverse_norms(norms):
+    """1 / norm, with 0 for empty rows (they have no direction: similarity 0, not NaN)."""
+    inverse = np.zeros_like(norms, dtype=np.float32)
+    np.divide(1.0, norms, out=inverse, where=norms > 0)
+    return inverse
+
+
+def top_k(scores, k):
+    """Indices of the k largest entries of each row of `scores`, best first."""
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+def top_k_neighbors(matrix, norms, k, rows=None, block_size=1024):
+    """Top-k cosine neighbors (excluding the row itself) for `rows` (default: all).
+
+    Works in blocks of `block_size` rows so only a (block_size, n_rows) score
+    matrix is ever dense. Returns (ids int32, similarities float32), best first.
+    """
+    rows = np.arange(matrix.shape[0]) if rows is None else np.asarray(rows)
+    k = min(k, max(matrix.shape[0] - 1, 1))
+    ids = np.empty((len(rows), k), dtype=np.int32)
+    sims = np.empty((len(rows), k), dtype=np.float32)
+    matrix_t = transposed(matrix)
+    for start in range(0, len(rows), block_size):
+        block_rows = rows[start:start + block_size]
+        scores = cosine_scores(matrix, norms, block_rows, matrix_t)
+        scores[np.arange(len(block_rows)), block_rows] = -np.inf  # never your own neighbor
+        block_ids, block_sims = top_k(scores, k)
+        ids[start:start + len(block_rows)] = block_ids
+        sims[start:start + len(block_rows)] = block_sims
+    return ids, sims
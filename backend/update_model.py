@@ -0,0 +1,225 @@
+"""Fold a delta of new ratings into the built artifacts without a full retrain.
+
+    python update_model.py data/ratings_delta.csv [--books data/books_delta.csv]
+
+The delta uses the ratings.csv schema (user_id, book_id, rating); --books
+takes extra rows in the books.csv schema for titles not in the catalog yet.
+Only rows touched by the delta are rewritten, and only neighbor lists that
+the delta can actually change are patched. The activity filters are
+applied to new books only; append the delta to data/ratings.csv so the next
+full setup_model.py build sees it too.
+"""
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from als import fold_in
+from artifacts import read_version
+from pipeline import file_digest
+from reader_sets import reader_sets
+from setup_model import clean_books, write_artifacts
+from similarity import as_float, cosine_scores, inverse_norms, row_norms, top_k, top_k_neighbors, transposed
+
+
+def resize_rows_cols(matrix, n_rows, n_cols):
+    """Pad a CSR matrix with empty rows/columns without touching its data."""
+    padding = np.full(n_rows - matrix.shape[0], matrix.indptr[-1], dtype=matrix.indptr.dtype)
+    return csr_matrix((matrix.data, matrix.indices, np.concatenate([matrix.indptr, padding])),
+                      shape=(n_rows, n_cols))
+
+
+def patch_matrix(book_sparse, rows, cols, values):
+    """Set book_sparse[rows, cols] = values (new ratings replace old ones)."""
+    delta = csr_matrix((values, (rows, cols)), shape=book_sparse.shape, dtype=book_sparse.dtype)
+    overwritten = book_sparse.multiply(delta.astype(bool))
+    patched = (book_sparse - overwritten + delta).tocsr()
+    patched.eliminate_zeros()
+    patched.sort_indices()
+    return patched
+
+
+def update_neighbors(book_sparse, norms, neighbor_ids, neighbor_sims, changed, block_size=1024):
+    """Refresh the top-k table after the vectors of `changed` rows moved.
+
+    Cosine is symmetric, so the changed rows' scores against every row give
+    both their own new lists and every other row's new score for each
+    changed row. They are computed `block_size` changed rows at a time,
+    keeping only each block's top-k and a running per-row max, so memory is
+    O(block_size * n) however large the delta.
+    - a row whose list holds a changed row, or that a changed row now
+      beats, is patched: its changed entries take their new scores, the
+      other changed rows are merged in, and the list is re-sorted;
+    - only if that leaves its k-th score below the old one (a changed
+      neighbor dropped and nothing scored replaces it) can an unscored row
+      belong in the list, so only those rows are recomputed exactly.
+    Rows in neither set cannot be affected and are left alone.
+    """
+    n_rows, k = book_sparse.shape[0], neighbor_ids.shape[1]
+    n_old = neighbor_ids.shape[0]
+    ids = np.zeros((n_rows, k), dtype=np.int32)
+    sims = np.full((n_rows, k), -np.inf, dtype=np.float32)
+    ids[:n_old], sims[:n_old] = neighbor_ids, neighbor_sims
+    old_kth = sims[:, -1].copy()
+
+    is_changed = np.zeros(n_rows, dtype=bool)
+    is_changed[changed] = True
+    lists_hit = np.zeros(n_rows, dtype=bool)
+    lists_hit[:n_old] = ((neighbor_ids >= 0) & is_changed[neighbor_ids]).any(axis=1)
+
+    # Changed rows against every row, one block at a time: O(|changed| * n) work
+    best_changed = np.full(n_rows, -np.inf, dtype=np.float32)
+    matrix_t = transposed(book_sparse)
+    for start in range(0, len(changed), block_size):
+        block = changed[start:start + block_size]
+        scores = cosine_scores(book_sparse, norms, block, matrix_t)
+        scores[np.arange(len(block)), block] = -np.inf
+        ids[block], sims[block] = top_k(scores, k)
+        np.maximum(best_changed, scores.max(axis=0), out=best_changed)
+    patch = np.flatnonzero((lists_hit | (best_changed >= old_kth)) & ~is_changed)
+
+    # Patched rows against the changed rows only: (block_size, |changed|) at a time
+    changed_t = transposed(book_sparse[changed])
+    inverse = inverse_norms(norms)
+    for start in range(0, len(patch), block_size):
+        block = patch[start:start + block_size]
+        scores = np.asarray((as_float(book_sparse[block]) @ changed_t).todense(), dtype=np.float32)
+        scores *= inverse[block][:, None]
+        scores *= inverse[changed][None, :]
+        # Stale entries for changed rows drop out; the changed rows come back with their new scores
+        stale = (ids[block] >= 0) & is_changed[ids[block]]
+        merged_ids = np.hstack([ids[block], np.broadcast_to(changed, (len(block), len(changed)))])
+        merged_sims = np.hstack([np.where(stale, -np.inf, sims[block]), scores])
+        order, best = top_k(merged_sims, k)
+        ids[block], sims[block] = np.take_along_axis(merged_ids, order, axis=1), best
+
+    recompute = patch[sims[patch, -1] < old_kth[patch]]
+    if len(recompute):
+        ids[recompute], sims[recompute] = top_k_neighbors(book_sparse, norms, k, rows=recompute)
+    return ids, sims, len(patch), len(recompute)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply a ratings delta to the built artifacts")
+    parser.add_argument('ratings', help="delta CSV: user_id,book_id,rating")
+    parser.add_argument('--books', help="new catalog rows in the books.csv schema")
+    parser.add_argument('--min-book-ratings', type=int, default=10,
+                        help="ratings a book new to the matrix needs in the delta to get a row")
+    args = parser.parse_args()
+    start = time.perf_counter()
+
+    print("--- 1. LOADING ARTIFACTS ---")
+    book_sparse = pickle.load(open('book_sparse.pkl', 'rb'))
+    book_names = pickle.load(open('book_names.pkl', 'rb'))
+    books = pickle.load(open('books_metadata.pkl', 'rb'))
+    user_ids = np.load('user_ids.npy')
+    norms = np.load('book_norms.npy')
+    neighbor_ids = np.load('book_neighbors.npy')
+    neighbor_sims = np.load('book_neighbor_sims.npy')
+    previous_version = read_version()
+
+    print("--- 2. READING DELTA ---")
+    if args.books:
+        new_books = clean_books({"frame": pd.read_csv(args.books, on_bad_lines='skip')})['books']
+        new_books = new_books[~new_books['book_id'].isin(books['book_id'])]
+        books = pd.concat([books, new_books])
+        print(f"{len(new_books)} new catalog entries")
+    delta = pd.read_csv(args.ratings).merge(books[['book_id', 'title']], on='book_id')
+    delta.drop_duplicates(['user_id', 'title'], keep='last', inplace=True)
+
+    # Titles new to the matrix only get a row once they clear the book threshold
+    row_of = {title: i for i, title in enumerate(book_names)}
+    new_titles = delta.loc[~delta['title'].isin(row_of), 'title'].value_counts()
+    added_titles = new_titles[new_titles >= args.min_book_ratings].index.tolist()
+    for title in added_titles:
+        row_of[title] = len(book_names)
+        book_names.append(title)
+    delta = delta[delta['title'].isin(row_of)]
+    if delta.empty:
+        print("Nothing to apply: no delta rating matches a book with a matrix row")
+        return
+
+    col_of = {int(user_id): i for i, user_id in enumerate(user_ids.tolist())}
+    added_users = [user_id for user_id in pd.unique(delta['user_id']) if int(user_id) not in col_of]
+    for user_id in added_users:
+        col_of[int(user_id)] = len(col_of)
+    user_ids = np.concatenate([user_ids, np.array(added_users, dtype=user_ids.dtype)])
+    print(f"{len(delta)} ratings, {len(added_titles)} new books, {len(added_users)} new users "
+          f"({new_titles.sum() - new_titles[added_titles].sum()} ratings for books below threshold skipped)")
+
+    print("--- 3. PATCHING MATRIX ---")
+    rows = delta['title'].map(row_of).to_numpy()
+    cols = delta['user_id'].map(col_of).to_numpy()
+    book_sparse = resize_rows_cols(book_sparse, len(book_names), len(user_ids))
+    book_sparse = patch_matrix(book_sparse, rows, cols, delta['rating'].to_numpy(dtype=book_sparse.dtype))
+    changed = np.unique(rows)
+    norms = np.concatenate([norms, np.zeros(len(added_titles), dtype=norms.dtype)])
+    norms[changed] = row_norms(book_sparse[changed])
+
+    print("--- 4. UPDATING NEIGHBORS ---")
+    neighbor_ids, neighbor_sims, patched, recomputed = update_neighbors(
+        book_sparse, norms, neighbor_ids, neighbor_sims, changed)
+    print(f"{len(changed)} books changed: {patched} other lists patched ({recomputed} of them recomputed), "
+          f"{len(book_names) - len(changed) - patched} untouched")
+
+    extra_arrays = {}
+    if os.path.exists('book_readers.npy'):
+        # Reads only ever get added: merge the delta's reads in (keeps to-read reads intact)
+        indptr, indices = np.load('book_readers_indptr.npy'), np.load('book_readers.npy')
+        old_readers = csr_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr),
+                                 shape=(len(indptr) - 1, len(user_ids)))
+        indptr, indices = reader_sets(resize_rows_cols(old_readers, len(book_names), len(user_ids)), rows, cols)
+        extra_arrays.update({'book_readers_indptr.npy': indptr, 'book_readers.npy': indices})
+
+    if os.path.exists('als_item_factors.npy'):
+        # Fold the touched users and books back in against the other side's factors
+        reg, alpha, implicit = np.load('als_params.npy').tolist()
+        item_factors = np.load('als_item_factors.npy')
+        user_factors = np.load('als_user_factors.npy')
+        item_factors = np.vstack([item_factors, np.zeros((len(added_titles), item_factors.shape[1]), np.float32)])
+        user_factors = np.vstack([user_factors, np.zeros((len(added_users), user_factors.shape[1]), np.float32)])
+        by_user = book_sparse.T.tocsr()
+        item_gram = item_factors.T @ item_factors
+        for col in np.unique(cols):
+            user_factors[col] = fold_in(item_factors, by_user[col].indices, by_user[col].data, reg, alpha,
+                                        bool(implicit), item_gram)
+        user_gram = user_factors.T @ user_factors
+        for row in changed:
+            item_factors[row] = fold_in(user_factors, book_sparse[row].indices, book_sparse[row].data, reg, alpha,
+                                        bool(implicit), user_gram)
+        extra_arrays.update({'als_item_factors.npy': item_factors, 'als_user_factors.npy': user_factors,
+                             'als_params.npy': np.load('als_params.npy')})
+
+    if os.path.exists('content_neighbors.npy'):
+        # Carried over; catalog entries added by --books get no content neighbors until the next build
+        n_catalog = len(books.drop_duplicates('title'))
+        for name, fill in (('content_neighbors.npy', -1), ('content_neighbor_sims.npy', -np.inf)):
+            table = np.load(name)
+            padding = np.full((n_catalog - len(table), table.shape[1]), fill, dtype=table.dtype)
+            extra_arrays[name] = np.vstack([table, padding])
+
+    if os.path.exists('book_clusters.npy'):
+        # Carried over; catalog entries added by --books are their own cluster until the next build
+        clusters = np.load('book_clusters.npy')
+        n_new = len(books.drop_duplicates('title')) - len(clusters)
+        extra_arrays['book_clusters.npy'] = np.concatenate(
+            [clusters, clusters.max(initial=-1) + 1 + np.arange(n_new, dtype=clusters.dtype)])
+
+    if os.path.exists('author_names.npy'):
+        # Carried over as is; authors new to the matrix join the index at the next build
+        for name in ('author_names.npy', 'author_neighbors.npy', 'author_neighbor_sims.npy'):
+            extra_arrays[name] = np.load(name)
+
+    print("--- 5. SAVING ARTIFACTS ---")
+    delta_key = file_digest(args.ratings) + (f"+{file_digest(args.books)}" if args.books else "")
+    write_artifacts(book_sparse, book_names, user_ids, books, norms, neighbor_ids, neighbor_sims,
+                    f"{previous_version}+{delta_key}", extra_arrays)
+    print(f"SUCCESS! Update applied in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()